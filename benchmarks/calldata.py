@@ -0,0 +1,180 @@
+"""Compares transaction construction with templates against string building.
+
+Run from the project root:
+
+    python -m benchmarks.calldata [--accounts 1000] [--repeat 5]
+
+The string-building side is the way transactions were put together before
+modules/tx_templates.py: hex concatenation with the address checksummed, the
+gas price converted with to_wei on every call and a contract object built for
+every getTimeUntilNextSignIn call.
+Each case is run a few times and the best time is reported. Fails if both
+sides don't produce the same calldata.
+"""
+import argparse
+import sys
+import time
+
+from eth_account import Account as EthAccount
+from web3 import AsyncWeb3
+
+from modules.tx_templates import (
+    DAILY,
+    DAILY_CLAIM_ABI,
+    MINT,
+    RUFFLE,
+    sign_in_time_call,
+)
+
+
+GAS_PRICE = 2 * 10**9
+SIGNATURE = "0x" + "1b" * 65
+
+
+def legacy_mint(w3, address, nonce, signature):
+    return {
+        "to": "0xC92Df682A8DC28717C92D7B5832376e6aC15a90D",
+        "from": address,
+        "data": f"0xf75e03840000000000000000000000000000000000000000000000000000000000000020000000000000000000000000{address[2:]}000000000000000000000000000000000000000000000000000000000000000100000000000000000000000000000000000000000000000000000000000000600000000000000000000000000000000000000000000000000000000000000041{signature[2:]}00000000000000000000000000000000000000000000000000000000000000",
+        "gasPrice": w3.to_wei(2, "gwei"),
+        "gas": 210000,
+        "nonce": nonce,
+        "chainId": 56,
+    }
+
+
+def legacy_daily(w3, address, nonce):
+    return {
+        "to": "0xE3bA0072d1da98269133852fba1795419D72BaF4",
+        "from": address,
+        "data": "0x9e4cda43",
+        "gasPrice": w3.to_wei(2, "gwei"),
+        "gas": 100000,
+        "nonce": nonce,
+        "chainId": 56,
+    }
+
+
+def legacy_ruffle(w3, address, nonce, xp, ruffle_nonce, signature):
+    data = (
+        "0x9fc96c7e"
+        "0000000000000000000000000000000000000000000000000000000000000020"
+        f"000000000000000000000000{address[2:]}"
+        f"{format(xp, '064x')}"
+        f"{format(int(ruffle_nonce), '064x')}"
+        "0000000000000000000000000000000000000000000000000000000000000080"
+        f"0000000000000000000000000000000000000000000000000000000000000041{signature[2:]}"
+        "00000000000000000000000000000000000000000000000000000000000000"
+    )
+    return {
+        "to": w3.to_checksum_address("0x557764618fc2f4eca692d422ba79c70f237113e6"),
+        "from": address,
+        "data": data,
+        "gasPrice": w3.to_wei("0.00002", "gwei"),
+        "gas": 100000,
+        "nonce": nonce,
+        "chainId": 204,
+    }
+
+
+def legacy_sign_in_time(w3, address):
+    contract = w3.eth.contract(
+        address=w3.to_checksum_address("0xe3ba0072d1da98269133852fba1795419d72baf4"),
+        abi=DAILY_CLAIM_ABI,
+    )
+    return contract.encodeABI(fn_name="getTimeUntilNextSignIn", args=[address])
+
+
+def template_transaction(template, address, tx_nonce, **params):
+    # Same steps as Account.send_data_tx, the gas price comes from the fee engine
+    return template.build(
+        address, tx_nonce, GAS_PRICE, template.encode(address, **params)
+    )
+
+
+def measure(func, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    w3 = AsyncWeb3()
+    addresses = [
+        EthAccount.from_key(f"0x{i:064x}").address
+        for i in range(1, args.accounts + 1)
+    ]
+
+    cases = {
+        "mint": (
+            lambda: [
+                legacy_mint(w3, address, i, SIGNATURE)
+                for i, address in enumerate(addresses)
+            ],
+            lambda: [
+                template_transaction(MINT, address, i, signature=SIGNATURE)
+                for i, address in enumerate(addresses)
+            ],
+        ),
+        "daily": (
+            lambda: [
+                legacy_daily(w3, address, i) for i, address in enumerate(addresses)
+            ],
+            lambda: [
+                template_transaction(DAILY, address, i)
+                for i, address in enumerate(addresses)
+            ],
+        ),
+        "ruffle": (
+            lambda: [
+                legacy_ruffle(w3, address, i, 20, "7", SIGNATURE)
+                for i, address in enumerate(addresses)
+            ],
+            lambda: [
+                template_transaction(
+                    RUFFLE, address, i, xp=20, nonce="7", signature=SIGNATURE
+                )
+                for i, address in enumerate(addresses)
+            ],
+        ),
+        "sign in time": (
+            lambda: [legacy_sign_in_time(w3, address) for address in addresses],
+            lambda: [sign_in_time_call(address)["data"] for address in addresses],
+        ),
+    }
+
+    failed = False
+    for name, (legacy, template) in cases.items():
+        legacy_result, legacy_time = measure(legacy, args.repeat)
+        template_result, template_time = measure(template, args.repeat)
+
+        if name == "sign in time":
+            legacy_data, template_data = legacy_result, template_result
+        else:
+            legacy_data = [tx["data"] for tx in legacy_result]
+            template_data = [tx["data"] for tx in template_result]
+        same = [a.lower() for a in legacy_data] == template_data
+
+        print(
+            f"{name:>12} | strings {args.accounts / legacy_time:10.0f}/s | "
+            f"templates {args.accounts / template_time:10.0f}/s | "
+            f"x{legacy_time / template_time:.1f}"
+            + ("" if same else " | calldata differs")
+        )
+        failed |= not same
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Replays a synthetic StarryNift day for 100 accounts and checks the budgets.
+
+Run from the project root:
+
+    python -m benchmarks.replay_day [--accounts 100] [--latency-scale 1.0]
+
+Every account logs in, finds its pass minted, checks in on BSC, ruffles on
+opBNB and completes the Follow quest. Transactions are simulated before
+sending. Fails if the number of API/RPC calls or the wall time exceed the
+budgets below.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from loguru import logger
+
+from modules.account import Account
+from modules.cassette import REDACTED_SIGNATURE, Cassette
+from modules.executor import Executor
+from settings import BNB_RPC, OPBNB_RPC, USER_IDS_TO_FOLLOW
+
+
+API = "api.starrynift.art/api-v2"
+API_LATENCY = 0.15
+RPC_LATENCY = 0.05
+
+# Calls per account
+HTTP_CALLS_BUDGET = 10
+RPC_CALLS_BUDGET = 14
+# Seconds for the whole fleet: signing and parsing plus replayed latency at scale 1
+CPU_TIME_BUDGET = 3
+LATENCY_BUDGET = 2
+
+
+def http(method, path, response, status=200):
+    return {
+        "kind": "http",
+        "method": method,
+        "target": f"{API}{path}",
+        "request": None,
+        "status": status,
+        "retry_after": None,
+        "response": json.dumps(response),
+        "latency": API_LATENCY,
+    }
+
+
+def rpc(rpc_url, method, result):
+    return {
+        "kind": "rpc",
+        "method": method,
+        "target": rpc_url.split("/")[2],
+        "request": [],
+        "response": {"jsonrpc": "2.0", "id": 0, "result": result},
+        "latency": RPC_LATENCY,
+    }
+
+
+def transaction(rpc_url, address, tx_hash):
+    receipt = {
+        "blockHash": "0x" + "ab" * 32,
+        "blockNumber": "0x11",
+        "contractAddress": None,
+        "cumulativeGasUsed": "0xc350",
+        "effectiveGasPrice": "0x3b9aca00",
+        "from": address,
+        "gasUsed": "0xc350",
+        "logs": [],
+        "status": "0x1",
+        "to": address,
+        "transactionHash": tx_hash,
+        "transactionIndex": "0x0",
+        "type": "0x0",
+    }
+    return [
+        rpc(
+            rpc_url,
+            "eth_feeHistory",
+            {
+                "oldestBlock": "0x10",
+                "baseFeePerGas": ["0x0", "0x0"],
+                "gasUsedRatio": [0.5],
+                "reward": [["0x3b9aca00"]],
+            },
+        ),
+        rpc(rpc_url, "eth_getTransactionCount", "0x1"),
+        rpc(rpc_url, "eth_call", "0x"),
+        rpc(rpc_url, "eth_sendRawTransaction", tx_hash),
+        rpc(rpc_url, "eth_blockNumber", "0x10"),
+        rpc(rpc_url, "eth_getTransactionReceipt", receipt),
+    ]
+
+
+def build_cassette(account_id, address):
+    tx_hash = "0x" + f"{account_id:064x}"
+    return [
+        http("GET", "/starryverse/auth/wallet/challenge", {"message": "Sign in"}),
+        http("POST", "/starryverse/auth/wallet/evm/login", {"token": "<redacted>"}),
+        http("GET", "/starryverse/character", {"userId": f"user{account_id}"}),
+        http(
+            "POST",
+            "/citizenship/raffle/status",
+            {"used": False, "signature": REDACTED_SIGNATURE, "xp": 20, "nonce": "7"},
+        ),
+        http(
+            "GET",
+            "/citizenship/citizenship-card/check-card-minted",
+            {"isMinted": True},
+        ),
+        rpc(BNB_RPC, "eth_call", "0x" + "00" * 32),
+        *transaction(BNB_RPC, address, tx_hash),
+        http("POST", "/webhook/confirm/daily-checkin/checkin", {"ok": 1}),
+        *transaction(OPBNB_RPC, address, tx_hash),
+        http("POST", "/webhook/confirm/raffle/mint", {"ok": 1}),
+        http(
+            "GET",
+            "/citizenship/citizenship-card/daily-tasks",
+            {
+                "items": [
+                    {"name": "Follow", "completed": False},
+                    {"name": "Online", "completed": True},
+                ]
+            },
+        ),
+        http(
+            "GET",
+            f"/starryverse/character/user/{USER_IDS_TO_FOLLOW[0]}",
+            {"userId": USER_IDS_TO_FOLLOW[0], "isFollow": False},
+        ),
+        http("POST", "/starryverse/user/follow", {"ok": 1}),
+    ]
+
+
+async def replay_day(accounts_count, latency_scale, cassette_dir):
+    executor = Executor([], [])
+
+    accounts = []
+    for i in range(1, accounts_count + 1):
+        account = Account(id=i, key=f"0x{i:064x}", proxy="", user_agent="benchmark")
+        path = os.path.join(cassette_dir, f"{account.address}.jsonl")
+        with open(path, "w") as f:
+            for entry in build_cassette(i, account.address):
+                f.write(json.dumps(entry) + "\n")
+        account.use_cassette(Cassette(path, "replay", latency_scale))
+        accounts.append(account)
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[executor._run_account_stages(account) for account in accounts]
+    )
+    wall_time = time.perf_counter() - start
+
+    calls = Counter()
+    for account in accounts:
+        for (kind, method, target), count in account.cassette.calls.items():
+            calls[kind] += count
+
+    executor.stage_timings.log_summary()
+    return calls, wall_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    logger.add(
+        sys.stdout, level="INFO", filter=lambda r: r["function"] == "log_summary"
+    )
+
+    with tempfile.TemporaryDirectory() as cassette_dir:
+        calls, wall_time = asyncio.run(
+            replay_day(args.accounts, args.latency_scale, cassette_dir)
+        )
+
+    budgets = {
+        "http": HTTP_CALLS_BUDGET * args.accounts,
+        "rpc": RPC_CALLS_BUDGET * args.accounts,
+    }
+    wall_time_budget = CPU_TIME_BUDGET + LATENCY_BUDGET * args.latency_scale
+
+    failed = False
+    for kind, budget in budgets.items():
+        print(f"{kind} calls: {calls[kind]} (budget {budget})")
+        failed |= calls[kind] > budget
+    print(f"wall time: {wall_time:.2f}s (budget {wall_time_budget:.2f}s)")
+    failed |= wall_time > wall_time_budget
+
+    if failed:
+        print("Budget exceeded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Compares the raw JSON-RPC client with the AsyncWeb3 path accounts used before.
+
+Run from the project root:
+
+    python -m benchmarks.rpc_client [--calls 2000] [--concurrency 20]
+
+Both sides talk to a local JSON-RPC server started by the benchmark in a
+separate process and go through the same rate limiter and concurrency
+bookkeeping, so the difference is the per-call overhead of the request
+pipeline.
+
+Allocations are measured with tracemalloc on sequential calls answered from
+memory through the cassette replay hook: the peak of memory allocated while
+one call is in flight, averaged over the calls. Over HTTP the 256 KiB socket
+read buffer of asyncio would hide everything else.
+"""
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+
+import aiohttp
+from aiohttp import web
+from loguru import logger
+from web3 import AsyncWeb3
+from web3.middleware import async_geth_poa_middleware
+
+from modules.rate_limiter import ThrottledHTTPProvider, rate_limiter
+from modules.rpc_client import RPCClient, close_sessions, decode_receipt, to_int
+
+
+HOST = "127.0.0.1"
+PORT = 18545
+ADDRESS = "0x" + "11" * 20
+TX_HASH = "0x" + "ab" * 32
+
+RECEIPT = {
+    "blockHash": "0x" + "cd" * 32,
+    "blockNumber": "0x11",
+    "contractAddress": None,
+    "cumulativeGasUsed": "0xc350",
+    "effectiveGasPrice": "0x3b9aca00",
+    "from": ADDRESS,
+    "gasUsed": "0xc350",
+    "logs": [],
+    "logsBloom": "0x" + "00" * 256,
+    "status": "0x1",
+    "to": ADDRESS,
+    "transactionHash": TX_HASH,
+    "transactionIndex": "0x0",
+    "type": "0x0",
+}
+RESULTS = {
+    "eth_blockNumber": "0x10",
+    "eth_call": "0x" + "00" * 31 + "05",
+    "eth_gasPrice": "0x3b9aca00",
+    "eth_getTransactionCount": "0x7",
+    "eth_getTransactionReceipt": RECEIPT,
+}
+
+
+class CannedResponses:
+    replaying = True
+
+    async def replay_rpc(self, endpoint, method):
+        return {"jsonrpc": "2.0", "id": 0, "result": RESULTS[method]}
+
+
+async def handle(request):
+    body = await request.json()
+
+    def answer(call):
+        return {"jsonrpc": "2.0", "id": call["id"], "result": RESULTS[call["method"]]}
+
+    if isinstance(body, list):
+        return web.json_response([answer(call) for call in body])
+    return web.json_response(answer(body))
+
+
+def web3_calls(w3):
+    return [
+        lambda: w3.eth.call({"to": ADDRESS, "data": "0x"}),
+        lambda: w3.eth.get_transaction_receipt(TX_HASH),
+        lambda: w3.eth.get_transaction_count(ADDRESS),
+        lambda: w3.eth.block_number,
+    ]
+
+
+def raw_calls(rpc):
+    return [
+        lambda: rpc.call({"to": ADDRESS, "data": "0x"}),
+        lambda: rpc.get_transaction_receipt(TX_HASH),
+        lambda: rpc.get_transaction_count(ADDRESS),
+        lambda: rpc.block_number(),
+    ]
+
+
+async def batch_call(rpc):
+    receipt, block = await rpc.batch(
+        [("eth_getTransactionReceipt", [TX_HASH]), ("eth_blockNumber", [])]
+    )
+    return decode_receipt(receipt), to_int(block)
+
+
+async def throughput(calls, total, workers, calls_per_request):
+    async def worker(offset):
+        for i in range(offset, total, workers):
+            await calls[i % len(calls)]()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(offset) for offset in range(workers)])
+    return total * calls_per_request / (time.perf_counter() - start)
+
+
+async def peak_memory(calls, total):
+    tracemalloc.start()
+    peaks = 0
+    for i in range(total):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await calls[i % len(calls)]()
+        peaks += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return peaks / total
+
+
+def serve():
+    app = web.Application()
+    app.router.add_post("/", handle)
+    web.run_app(app, host=HOST, port=PORT, access_log=None, print=None)
+
+
+async def start_server(endpoint):
+    server = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "benchmarks.rpc_client", "--serve"
+    )
+    async with aiohttp.ClientSession() as session:
+        for _ in range(100):
+            try:
+                async with session.post(
+                    endpoint, json={"id": 0, "method": "eth_gasPrice"}
+                ):
+                    return server
+            except aiohttp.ClientConnectionError:
+                await asyncio.sleep(0.1)
+    server.kill()
+    raise RuntimeError("Benchmark RPC server didn't start")
+
+
+async def run(total, workers):
+    endpoint = f"http://{HOST}:{PORT}/"
+    server = await start_server(endpoint)
+    unlimited = (10**9, 10**9)
+    rate_limiter.limits[(HOST, "rpc")] = unlimited
+
+    w3 = AsyncWeb3(
+        ThrottledHTTPProvider(endpoint), middlewares=[async_geth_poa_middleware]
+    )
+    rpc = RPCClient(endpoint)
+    cases = {
+        "AsyncWeb3": (w3, web3_calls(w3), 1),
+        "raw client": (rpc, raw_calls(rpc), 1),
+        "raw batch": (rpc, [lambda: batch_call(rpc)], 2),
+    }
+
+    try:
+        for name, (client, calls, calls_per_request) in cases.items():
+            # Warm up connections and lazy imports before measuring
+            await throughput(calls, len(calls) * workers, workers, calls_per_request)
+            rate = await throughput(calls, total, workers, calls_per_request)
+
+            provider = client.provider if client is w3 else client
+            provider.cassette = CannedResponses()
+            pipeline_rate = await throughput(calls, total, workers, calls_per_request)
+            memory = await peak_memory(calls, min(total, 500))
+            provider.cassette = None
+
+            print(
+                f"{name:>10} | {rate:6.0f} calls/s over HTTP | "
+                f"pipeline only: {pipeline_rate:6.0f} calls/s, "
+                f"{memory / calls_per_request / 1024:5.1f} KiB peak per call"
+            )
+    finally:
+        await close_sessions()
+        server.kill()
+        await server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve()
+        return
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+    asyncio.run(run(args.calls, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
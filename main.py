@@ -1,9 +1,13 @@
+import argparse
 import asyncio
 import sys
+from loguru import logger
 from questionary import Choice
 import questionary
 from config import PRIVATE_KEYS, PROXIES
 from modules.executor import Executor
+from modules.logger import setup_logger
+from modules.profiler import install_uvloop, profiler
 
 
 def get_module(executor: Executor):
@@ -15,6 +19,7 @@ def get_module(executor: Executor):
                 "Withdraw BNB from Binance": executor.withdraw_from_binance,
                 "StarryNift module": executor.run_starrynift,
                 "Get accounts stats": executor.get_accounts_stats,
+                "Get accounts stats history": executor.get_stats_history,
                 "Exit": "exit",
             }.items(),
             start=1,
@@ -31,11 +36,34 @@ def get_module(executor: Executor):
     return result
 
 
-async def main(module):
-    await module()
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="trace event loop lag and blocking calls, profile CPU per stage",
+    )
+    parser.add_argument(
+        "--uvloop", action="store_true", help="run on uvloop if it is installed"
+    )
+    return parser.parse_args()
+
+
+async def main(module, profile=False):
+    if profile:
+        profiler.start()
+    try:
+        await module()
+    finally:
+        await profiler.stop()
+        await logger.complete()
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    setup_logger()
+    if args.uvloop:
+        install_uvloop()
     executor = Executor(PRIVATE_KEYS, PROXIES)
     module = get_module(executor)
-    asyncio.run(main(module))
+    asyncio.run(main(module, args.profile))
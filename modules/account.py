@@ -3,17 +3,41 @@ import random
 import time
 from eth_account import Account as EthAccount
 from eth_account.messages import encode_defunct
-from loguru import logger
+from modules.cassette import open_cassette
+from modules.concurrency import concurrency
+from modules.fee_engine import fee_engine
+from modules.logger import account_logger, stage
+from modules.quests import quest, quest_scheduler
+from modules.rate_limiter import (
+    ThrottledHTTPProvider,
+    parse_retry_after,
+    rate_limiter,
+)
+from modules.rpc_client import RPCClient, decode_receipt, to_int
+from modules.simulation import simulator
+from modules.tx_templates import (
+    DAILY,
+    MINT,
+    RUFFLE,
+    decode_uint,
+    sign_in_time_call,
+)
 from modules.utils import retry
-from settings import BNB_RPC, DISABLE_SSL, OPBNB_RPC, REF_LINK, USER_IDS_TO_FOLLOW
-from config import DAILY_CLAIM_ABI
+from settings import (
+    BNB_RPC,
+    DISABLE_SSL,
+    OPBNB_RPC,
+    RATE_LIMIT_RETRIES,
+    REF_LINK,
+    SIMULATE_TRANSACTIONS,
+    USER_IDS_TO_FOLLOW,
+)
 import aiohttp
 
 import datetime
 
 from web3 import AsyncWeb3
 from web3.middleware import async_geth_poa_middleware
-from web3.exceptions import TransactionNotFound
 
 
 class Account:
@@ -40,31 +64,88 @@ class Account:
         self.account = EthAccount.from_key(self.key)
         self.address = self.account.address
         self.user_agent = user_agent
+        self.logger = account_logger(self)
 
         self.referral_code = REF_LINK.split("=")[1]
 
-        self.w3 = AsyncWeb3(
-            AsyncWeb3.AsyncHTTPProvider(BNB_RPC),
+        self.w3 = self.get_web3(BNB_RPC)
+        self.opbnb_w3 = self.get_web3(OPBNB_RPC)
+        # Hot path calls skip the web3 middleware and formatters
+        self.bsc_rpc = RPCClient(BNB_RPC)
+        self.opbnb_rpc = RPCClient(OPBNB_RPC)
+        self.use_cassette(open_cassette(self.address))
+
+        self.user_id = None
+        # Actions the balance doesn't cover, filled by balance pre-flight
+        self.unaffordable_actions = set()
+
+    def get_web3(self, rpc):
+        return AsyncWeb3(
+            ThrottledHTTPProvider(rpc),
             middlewares=[async_geth_poa_middleware],
         )
 
-        self.quests_mapping = {
-            "Follow": self.follow_user,
-            "Online": self.complete_online_quest,
-        }
+    def use_cassette(self, cassette):
+        self.cassette = cassette
+        self.w3.provider.cassette = cassette
+        self.opbnb_w3.provider.cassette = cassette
+        self.bsc_rpc.cassette = cassette
+        self.opbnb_rpc.cassette = cassette
 
-        self.user_id = None
+    def get_chain_clients(self, chain_id):
+        if chain_id == 56:
+            return self.w3, self.bsc_rpc
+        if chain_id == 204:
+            return self.opbnb_w3, self.opbnb_rpc
+        raise ValueError("Invalid chain id")
 
     async def make_request(self, method, url, **kwargs):
+        if self.cassette is not None and self.cassette.replaying:
+            return await self._request_with_retries(method, url, None, kwargs)
+
         if DISABLE_SSL:
             kwargs["ssl"] = False
 
         async with aiohttp.ClientSession(
             headers=self.headers, trust_env=True
         ) as session:
-            return await session.request(
+            return await self._request_with_retries(method, url, session, kwargs)
+
+    async def _request_with_retries(self, method, url, session, kwargs):
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            if session is None:
+                # Replay takes the same 429 path, only the network call is skipped
+                response = await self.cassette.replay_http(method, url)
+            else:
+                response = await self._send_request(session, method, url, kwargs)
+
+            if response.status != 429 or attempt == RATE_LIMIT_RETRIES:
+                return response
+
+            response.release()
+            rate_limiter.penalize(
+                url, parse_retry_after(response.headers.get("Retry-After"))
+            )
+
+    async def _send_request(self, session, method, url, kwargs):
+        endpoint = url.split("?")[0]
+        await rate_limiter.acquire(url)
+        start = time.perf_counter()
+        try:
+            response = await session.request(
                 method, url, proxy=f"http://{self.proxy}", **kwargs
             )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            concurrency.observe(endpoint, time.perf_counter() - start, True)
+            raise
+
+        latency = time.perf_counter() - start
+        concurrency.observe(
+            endpoint, latency, response.status == 429 or response.status >= 500
+        )
+        if self.cassette is not None:
+            await self.cassette.record_http(method, url, kwargs, response, latency)
+        return response
 
     def get_current_date(self, utc=False):
         if utc:
@@ -80,70 +161,120 @@ class Account:
         )
 
     async def wait_until_tx_finished(
-        self, hash: str, max_wait_time=480, web3=None
+        self, hash: str, max_wait_time=480, chain_id=56, transaction=None
     ) -> None:
-        if web3 is None:
-            web3 = self.w3
+        web3, rpc = self.get_chain_clients(chain_id)
+
+        # Same-nonce replacements are only sent when the signed transaction is known
+        hashes = [hash]
+        if transaction is not None:
+            replace_after = fee_engine.get_settings(chain_id)["replace_after_blocks"]
+            start_block = sent_block = None
 
         start_time = time.time()
         while True:
-            try:
-                receipts = await web3.eth.get_transaction_receipt(hash)
-                status = receipts.get("status")
-                if status == 1:
-                    logger.success(f"[{self.address}] {hash.hex()} successfully!")
-                    return receipts["transactionHash"].hex()
-                elif status is None:
-                    await asyncio.sleep(0.3)
-                else:
-                    logger.error(
-                        f"[{self.id}][{self.address}] {hash.hex()} transaction failed! {receipts}"
+            # Receipts of all sent versions and the block number in one request
+            calls = [
+                ("eth_getTransactionReceipt", [tx_hash]) for tx_hash in reversed(hashes)
+            ]
+            if transaction is not None:
+                calls.append(("eth_blockNumber", []))
+            results = await rpc.batch(calls)
+            if transaction is not None:
+                block = to_int(results.pop())
+                if start_block is None:
+                    start_block = sent_block = block
+
+            for tx_hash, receipts in zip(reversed(hashes), results):
+                receipts = decode_receipt(receipts)
+                if receipts is None or receipts.get("status") is None:
+                    continue
+                status = receipts["status"]
+
+                if transaction is not None:
+                    fee_engine.record_inclusion(
+                        chain_id,
+                        time.time() - start_time,
+                        receipts["blockNumber"] - start_block,
+                        receipts,
+                        len(hashes) - 1,
                     )
-                    return None
-            except TransactionNotFound:
-                if time.time() - start_time > max_wait_time:
-                    logger.error(
-                        f"[{self.id}][{self.address}]{hash.hex()} transaction failed!"
-                    )
-                    return None
-                await asyncio.sleep(1)
+                if status == 1:
+                    self.logger.success(f"{tx_hash} successfully!")
+                    return receipts["transactionHash"]
+                self.logger.error(f"{tx_hash} transaction failed! {receipts}")
+                return None
+
+            if time.time() - start_time > max_wait_time:
+                self.logger.error(f"{hash} transaction failed!")
+                if transaction is not None:
+                    fee_engine.record_dropped(chain_id, len(hashes) - 1)
+                return None
+
+            if transaction is not None and block - sent_block >= replace_after:
+                sent_block = block
+                replacement = await self.replace_transaction(web3, rpc, transaction)
+                if replacement is not None:
+                    transaction, tx_hash = replacement
+                    hashes.append(tx_hash)
+
+            await asyncio.sleep(1)
+
+    async def replace_transaction(self, web3, rpc, transaction):
+        gas_price = await fee_engine.get_replacement_gas_price(
+            web3, transaction["chainId"], transaction["gasPrice"]
+        )
+        if gas_price is None:
+            return None
 
-    async def send_data_tx(
-        self, to, from_, data, gas_price=None, gas_limit=None, nonce=None, chain_id=None
-    ):
-        if chain_id == 56:
-            web3 = self.w3
-        elif chain_id == 204:
-            web3 = AsyncWeb3(
-                AsyncWeb3.AsyncHTTPProvider(OPBNB_RPC),
-                middlewares=[async_geth_poa_middleware],
+        replacement = {**transaction, "gasPrice": gas_price}
+        signed_transaction = web3.eth.account.sign_transaction(replacement, self.key)
+        try:
+            tx_hash = await rpc.send_raw_transaction(signed_transaction.rawTransaction)
+        except Exception as e:
+            # The previous transaction may have been mined in the meantime
+            self.logger.warning(
+                f"Replacement of nonce {transaction['nonce']} failed | {e}"
             )
-        else:
-            raise ValueError("Invalid chain id")
-
-        transaction = {
-            "to": to,
-            "from": from_,
-            "data": data,
-            "gasPrice": gas_price or web3.to_wei(await web3.eth.gas_price, "gwei"),
-            "gas": gas_limit or await web3.eth.estimate_gas({"to": to, "data": data}),
-            "nonce": nonce or await web3.eth.get_transaction_count(self.address),
-            "chainId": chain_id or await web3.eth.chain_id,
-        }
+            return None
+
+        self.logger.info(
+            f"Transaction with nonce {transaction['nonce']} not mined, replaced with "
+            f"{web3.from_wei(gas_price, 'gwei')} gwei: {tx_hash}"
+        )
+        return replacement, tx_hash
+
+    async def send_data_tx(self, template, **params):
+        web3, rpc = self.get_chain_clients(template.chain_id)
+
+        # Encoding validates the params before any RPC call is made
+        data = template.encode(self.address, **params)
+        transaction = template.build(
+            self.address,
+            await rpc.get_transaction_count(self.address),
+            await fee_engine.get_gas_price(web3, template.chain_id),
+            data,
+        )
+
+        if SIMULATE_TRANSACTIONS:
+            await simulator.simulate(rpc, transaction)
 
         signed_transaction = web3.eth.account.sign_transaction(transaction, self.key)
         try:
-            transaction_hash = await web3.eth.send_raw_transaction(
+            transaction_hash = await rpc.send_raw_transaction(
                 signed_transaction.rawTransaction
             )
             tx_hash = await self.wait_until_tx_finished(
-                transaction_hash, max_wait_time=480, web3=web3
+                transaction_hash,
+                max_wait_time=480,
+                chain_id=template.chain_id,
+                transaction=transaction,
             )
             if tx_hash is None:
                 return False, None
             return True, tx_hash
         except Exception as e:
-            logger.error(f"[{self.id}][{self.address}] Error while sending tx | {e}")
+            self.logger.error(f"Error while sending tx | {e}")
             return e, None
 
     def sign_msg(self, msg):
@@ -176,9 +307,10 @@ class Account:
 
         return (await response.json()).get("signature")
 
+    @stage("login")
     @retry
     async def login(self):
-        logger.info(f"[{self.id}][{self.address}] Logging in...")
+        self.logger.info("Logging in...")
 
         signature = self.sign_msg(await self.get_login_signature_message())
 
@@ -205,38 +337,42 @@ class Account:
 
         return bool(auth_token)
 
+    async def ensure_pass(self):
+        if await self.check_if_pass_is_minted():
+            return True
+        if "mint" in self.unaffordable_actions:
+            self.logger.warning("Not enough BNB on BSC to mint pass and check in")
+            return False
+        return await self.mint_nft_pass()
+
+    @stage("mint")
     async def mint_nft_pass(self):
-        logger.info(f"[{self.id}][{self.address}] Minting pass...")
+        self.logger.info("Minting pass...")
 
         signature = await self.get_mint_signature()
 
-        status, tx_hash = await self.send_mint_tx(signature)
+        result = await self.send_mint_tx(signature)
+        if result is None:
+            self.logger.error("Error while minting pass")
+            return False
+
+        status, tx_hash = result
 
         if status is True and await self.send_mint_tx_hash(tx_hash):
-            logger.success(f"[{self.id}][{self.address}] | Pass minted: {tx_hash}")
+            self.logger.success(f"Pass minted: {tx_hash}")
             return True
 
-        logger.error(
-            f"[{self.id}][{self.address}] | Error while minting pass: {status}"
-        )
+        self.logger.error(f"Error while minting pass: {status}")
         return False
 
     @retry
     async def send_mint_tx(self, signature):
-        return await self.send_data_tx(
-            to="0xC92Df682A8DC28717C92D7B5832376e6aC15a90D",
-            from_=self.address,
-            data=f"0xf75e03840000000000000000000000000000000000000000000000000000000000000020000000000000000000000000{self.address[2:]}000000000000000000000000000000000000000000000000000000000000000100000000000000000000000000000000000000000000000000000000000000600000000000000000000000000000000000000000000000000000000000000041{signature[2:]}00000000000000000000000000000000000000000000000000000000000000",
-            gas_price=self.w3.to_wei(2, "gwei"),
-            gas_limit=210000,
-            chain_id=56,
-        )
+        return await self.send_data_tx(MINT, signature=signature)
 
+    @stage("mint_check")
     @retry
     async def check_if_pass_is_minted(self):
-        logger.info(
-            f"[{self.id}][{self.address}] Checking if pass has already been minted..."
-        )
+        self.logger.info("Checking if pass has already been minted...")
 
         response = await self.make_request(
             "get",
@@ -264,38 +400,32 @@ class Account:
 
         return True
 
+    @stage("daily")
     async def daily_claim(self):
-        logger.info(f"[{self.id}][{self.address}] Checking in...")
+        self.logger.info("Checking in...")
 
         time_to_claim = await self.get_daily_claim_time()
         if time_to_claim > 0:
-            logger.info(
-                f"[{self.id}][{self.address}] Next claim in {datetime.timedelta(seconds=time_to_claim)}"
+            self.logger.info(
+                f"Next claim in {datetime.timedelta(seconds=time_to_claim)}"
             )
             return
 
         result = await self.send_daily_tx()
         if result is None:
-            logger.error(f"[{self.id}][{self.address}] Failed daily check in")
+            self.logger.error("Failed daily check in")
             return
 
         status, tx_hash = result
 
         if status is True and await self.send_daily_tx_hash(tx_hash):
-            logger.success(f"[{self.id}][{self.address}] Successfully daily checked in")
+            self.logger.success("Successfully daily checked in")
         else:
-            logger.error(f"[{self.id}][{self.address}] Failed daily check in")
+            self.logger.error("Failed daily check in")
 
     @retry
     async def send_daily_tx(self):
-        status, hash = await self.send_data_tx(
-            to="0xE3bA0072d1da98269133852fba1795419D72BaF4",
-            from_=self.address,
-            data=f"0x9e4cda43",
-            gas_price=self.w3.to_wei(2, "gwei"),
-            gas_limit=100000,
-            chain_id=56,
-        )
+        status, hash = await self.send_data_tx(DAILY)
 
         if not status:
             raise RuntimeError(f"Error while sending daily tx | {hash}")
@@ -319,43 +449,11 @@ class Account:
 
     @retry
     async def get_daily_claim_time(self):
-        contract = self.w3.eth.contract(
-            address=self.w3.to_checksum_address(
-                "0xe3ba0072d1da98269133852fba1795419d72baf4"
-            ),
-            abi=DAILY_CLAIM_ABI,
-        )
-        return await contract.functions.getTimeUntilNextSignIn(self.address).call()
+        return decode_uint(await self.bsc_rpc.call(sign_in_time_call(self.address)))
 
+    @stage("quests")
     async def complete_quests(self):
-        quests = await self.get_quests()
-
-        for item in quests:
-            quest = item["name"]
-            if not item["completed"]:
-                logger.info(f"[{self.id}][{self.address}] Completing quest: {quest}")
-                try:
-                    func = self.quests_mapping.get(quest)
-                    if func is None:
-                        logger.warning(f"Quest {quest} is not supported")
-                        continue
-                    result = await func()
-                    if result is False:
-                        logger.error(
-                            f"[{self.id}][{self.address}] {quest} Quest Failed"
-                        )
-                    else:
-                        logger.success(
-                            f"[{self.id}][{self.address}] {quest} Quest Completed"
-                        )
-                except RuntimeError as e:
-                    logger.error(
-                        f"[{self.id}][{self.address}] {quest} Quest Failed | {e}"
-                    )
-            else:
-                logger.info(
-                    f"[{self.id}][{self.address}] {quest} Quest Already Compeleted"
-                )
+        await quest_scheduler.run(self)
 
     @retry
     async def get_quests(self):
@@ -369,6 +467,7 @@ class Account:
 
         return (await response.json()).get("items")
 
+    @quest("Follow", cost=2, duration=5, resources=["follow"])
     @retry
     async def follow_user(self):
         user_to_follow = None
@@ -379,9 +478,7 @@ class Account:
                 break
 
         if user_to_follow is None:
-            logger.error(
-                f"[{self.id}][{self.address}] Already followed all users. Can't complete quest"
-            )
+            self.logger.error("Already followed all users. Can't complete quest")
             return False
 
         response = await self.make_request(
@@ -423,10 +520,12 @@ class Account:
 
         return await response.json()
 
+    @quest("Online", cost=21, duration=630, resources=["online"])
     async def complete_online_quest(self):
-        logger.info(f"[{self.id}][{self.address}] It would take about 10 minutes...")
+        self.logger.info("It would take about 10 minutes...")
         for i in range(21):
             await self.send_ping()
+            self.logger.bind(sample="ping").info(f"Ping {i + 1}/21 sent")
             await asyncio.sleep(30)
 
         return True
@@ -457,19 +556,22 @@ class Account:
 
         return (await response.json()).get("used")
 
-    async def ruffle(self):
-        logger.info(f"[{self.id}][{self.address}] Ruffling...")
+    @stage("ruffle")
+    async def ruffle(self, info=None):
+        self.logger.info("Ruffling...")
 
-        await asyncio.sleep(random.randint(3, 10))
-        info = await self.get_ruffle_info()
+        if not info or not (info["used"] or info["signature"]):
+            # Signature appears only after the daily check in is processed
+            await asyncio.sleep(random.randint(3, 10))
+            info = await self.get_ruffle_info()
         if info["used"]:
-            logger.info(f"[{self.id}][{self.address}] Already used free ruffle today")
+            self.logger.info("Already used free ruffle today")
             return
 
         if not info["signature"]:
-            logger.error(f"[{self.id}][{self.address}] Daily wasn't completed")
+            self.logger.error("Daily wasn't completed")
             return
-        logger.info(f"[{self.id}][{self.address}] Ruffle xp: {info['xp']}")
+        self.logger.info(f"Ruffle xp: {info['xp']}")
 
         result = await self.send_ruffle_tx(
             xp=info["xp"],
@@ -477,38 +579,20 @@ class Account:
             nonce=info["nonce"],
         )
         if result is None:
-            logger.error(f"[{self.id}][{self.address}] Ruffle failed")
+            self.logger.error("Ruffle failed")
             return
 
         status, tx_hash = result
 
         await self.send_ruffle_hash(tx_hash)
 
-        logger.success(f"[{self.id}][{self.address}] Ruffle success")
+        self.logger.success("Ruffle success")
         return True
 
     @retry
     async def send_ruffle_tx(self, xp, nonce, signature):
-        data = (
-            "0x9fc96c7e"
-            "0000000000000000000000000000000000000000000000000000000000000020"
-            f"000000000000000000000000{self.address[2:]}"
-            f"{format(xp, '064x')}"
-            f"{format(int(nonce), '064x')}"
-            "0000000000000000000000000000000000000000000000000000000000000080"
-            f"0000000000000000000000000000000000000000000000000000000000000041{signature[2:]}"
-            "00000000000000000000000000000000000000000000000000000000000000"
-        )
-
         status, tx_hash = await self.send_data_tx(
-            to=self.w3.to_checksum_address(
-                "0x557764618fc2f4eca692d422ba79c70f237113e6"
-            ),
-            from_=self.address,
-            data=data,
-            gas_price=self.w3.to_wei("0.00002", "gwei"),
-            gas_limit=100000,
-            chain_id=204,
+            RUFFLE, xp=xp, nonce=nonce, signature=signature
         )
         if not status:
             raise RuntimeError(f"Error while sending ruffle tx | {tx_hash}")
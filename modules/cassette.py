@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+from collections import Counter, defaultdict, deque
+from urllib.parse import urlparse
+
+from modules.utils import NonRetryableError
+from settings import CASSETTE_DIR, CASSETTE_MODE, REPLAY_LATENCY_SCALE
+
+
+# Values of these keys never reach cassette files
+REDACTED_KEYS = {"signature", "token", "authorization"}
+# Signatures keep their shape so replayed calldata is still well-formed
+REDACTED_SIGNATURE = "0x" + "00" * 65
+REDACTED = "<redacted>"
+# Params of these calls carry signed transactions or calldata with signatures
+REDACTED_RPC_METHODS = {"eth_call", "eth_sendRawTransaction"}
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {
+            key: (
+                redact_value(item) if key.lower() in REDACTED_KEYS else redact(item)
+            )
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def redact_body(body):
+    try:
+        return json.dumps(redact(json.loads(body)))
+    except ValueError:
+        return body
+
+
+def redact_value(value):
+    if isinstance(value, str) and value.startswith("0x"):
+        return REDACTED_SIGNATURE
+    if value is None:
+        return None
+    return REDACTED
+
+
+class ReplayResponse:
+    def __init__(self, status, body, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    async def json(self, **kwargs):
+        return json.loads(self.body)
+
+    async def text(self):
+        return self.body
+
+    def release(self):
+        pass
+
+
+class CassetteMiss(NonRetryableError):
+    pass
+
+
+class Cassette:
+    def __init__(self, path, mode, latency_scale=1.0):
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.entries = []
+        self.calls = Counter()
+        self.replay_queues = defaultdict(deque)
+
+        if self.replaying:
+            with open(path, "r") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.replay_queues[self._entry_key(entry)].append(entry)
+
+    @property
+    def recording(self):
+        return self.mode == "record"
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    def _entry_key(self, entry):
+        return entry["kind"], entry["method"], entry["target"]
+
+    def _http_target(self, url):
+        parsed = urlparse(url)
+        return f"{parsed.hostname}{parsed.path}"
+
+    def _rpc_target(self, endpoint):
+        return urlparse(endpoint).hostname
+
+    async def _replay(self, kind, method, target):
+        key = (kind, method, target)
+        self.calls[key] += 1
+
+        queue = self.replay_queues.get(key)
+        if not queue:
+            raise CassetteMiss(f"No recorded {kind} {method} {target} in {self.path}")
+
+        entry = queue.popleft()
+        if entry["latency"] and self.latency_scale:
+            await asyncio.sleep(entry["latency"] * self.latency_scale)
+        return entry
+
+    async def record_http(self, method, url, kwargs, response, latency):
+        # Reading here keeps the body available for the caller after the session closes
+        body = await response.text()
+        self.calls[("http", method.upper(), self._http_target(url))] += 1
+        self.entries.append(
+            {
+                "kind": "http",
+                "method": method.upper(),
+                "target": self._http_target(url),
+                "request": redact(kwargs.get("json")),
+                "status": response.status,
+                "retry_after": response.headers.get("Retry-After"),
+                "response": redact_body(body),
+                "latency": round(latency, 4),
+            }
+        )
+
+    async def replay_http(self, method, url):
+        entry = await self._replay("http", method.upper(), self._http_target(url))
+        headers = {}
+        if entry.get("retry_after") is not None:
+            headers["Retry-After"] = entry["retry_after"]
+        return ReplayResponse(entry["status"], entry["response"], headers)
+
+    def record_rpc(self, endpoint, method, params, response, latency):
+        self.calls[("rpc", method, self._rpc_target(endpoint))] += 1
+        self.entries.append(
+            {
+                "kind": "rpc",
+                "method": method,
+                "target": self._rpc_target(endpoint),
+                "request": [REDACTED]
+                if method in REDACTED_RPC_METHODS
+                else redact(list(params)),
+                "response": redact(dict(response)),
+                "latency": round(latency, 4),
+            }
+        )
+
+    async def replay_rpc(self, endpoint, method):
+        entry = await self._replay("rpc", method, self._rpc_target(endpoint))
+        return entry["response"]
+
+    def save(self):
+        if not self.recording:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+
+
+def open_cassette(name):
+    if CASSETTE_MODE is None:
+        return None
+
+    return Cassette(
+        os.path.join(CASSETTE_DIR, f"{name}.jsonl"),
+        CASSETTE_MODE,
+        REPLAY_LATENCY_SCALE,
+    )
@@ -0,0 +1,138 @@
+import asyncio
+import math
+import statistics
+import time
+from collections import deque
+
+from loguru import logger
+
+from settings import (
+    ADAPTIVE_THREADS,
+    CONCURRENCY_WINDOW,
+    ERROR_RATE_LIMIT,
+    LATENCY_TOLERANCE,
+    MAX_THREADS,
+    MIN_THREADS,
+    THREADS,
+)
+
+
+# Limit is multiplied by this on 429, 5xx or timeouts
+BACKOFF_RATIO = 0.7
+# Seconds after a backoff during which new failures don't lower the limit again
+BACKOFF_COOLDOWN = 10
+
+
+class AdaptiveConcurrency:
+    def __init__(self, initial, min_limit, max_limit, window, error_rate, tolerance):
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.limit = min(max(initial, self.min_limit), self.max_limit)
+        self.window = window
+        self.error_rate = error_rate
+        self.tolerance = tolerance
+
+        self.in_flight = 0
+        self.waiters = deque()
+        # Latency relative to the fastest response seen for the same endpoint
+        self.latency_ratios = []
+        self.failures = 0
+        self.min_latencies = {}
+        self.last_backoff = 0
+
+        self.started = time.monotonic()
+        self.history = [(0, self.limit, "initial")]
+
+    async def acquire(self):
+        if self.in_flight < self.limit and not self.waiters:
+            self.in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # The slot may have been handed over right before cancellation
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *args):
+        self.release()
+
+    def _wake_waiters(self):
+        while self.waiters and self.in_flight < self.limit:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _set_limit(self, limit, reason):
+        limit = min(max(limit, self.min_limit), self.max_limit)
+        if limit == self.limit:
+            return
+
+        self.limit = limit
+        self.history.append((time.monotonic() - self.started, limit, reason))
+        logger.debug(f"Concurrency limit set to {limit} | {reason}")
+        self._wake_waiters()
+
+    def observe(self, endpoint, latency, failed=False):
+        if failed:
+            self.failures += 1
+            now = time.monotonic()
+            if now - self.last_backoff > BACKOFF_COOLDOWN:
+                self.last_backoff = now
+                self._set_limit(math.floor(self.limit * BACKOFF_RATIO), "backoff")
+        else:
+            min_latency = min(self.min_latencies.get(endpoint, latency), latency)
+            self.min_latencies[endpoint] = min_latency
+            self.latency_ratios.append(latency / max(min_latency, 0.001))
+
+        if len(self.latency_ratios) + self.failures >= self.window:
+            self._evaluate_window()
+
+    def _evaluate_window(self):
+        samples = len(self.latency_ratios) + self.failures
+        error_rate = self.failures / samples
+        ratio = statistics.median(self.latency_ratios) if self.latency_ratios else 1
+        self.latency_ratios = []
+        self.failures = 0
+
+        if error_rate > self.error_rate:
+            self._set_limit(self.limit - 1, f"errors {error_rate:.0%}")
+        elif ratio > self.tolerance:
+            self._set_limit(self.limit - 1, f"latency x{ratio:.1f}")
+        elif self.waiters:
+            # Grow only while accounts are actually waiting for a slot
+            self._set_limit(self.limit + 1, "healthy")
+
+    def log_history(self, last=10):
+        limits = [limit for _, limit, _ in self.history]
+        changes = ", ".join(
+            f"{elapsed:.0f}s: {limit} ({reason})"
+            for elapsed, limit, reason in self.history[-last:]
+        )
+        logger.info(
+            f"Concurrency limit: {self.limit} | lowest {min(limits)}, "
+            f"highest {max(limits)}, {len(self.history) - 1} changes | "
+            f"last: {changes}"
+        )
+
+
+concurrency = AdaptiveConcurrency(
+    THREADS,
+    MIN_THREADS if ADAPTIVE_THREADS else THREADS,
+    MAX_THREADS if ADAPTIVE_THREADS else THREADS,
+    CONCURRENCY_WINDOW,
+    ERROR_RATE_LIMIT,
+    LATENCY_TOLERANCE,
+)
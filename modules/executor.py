@@ -4,60 +4,127 @@ import random
 from loguru import logger
 from fake_useragent import UserAgent
 from modules.account import Account
+from modules.concurrency import concurrency
+from modules.fee_engine import fee_engine
 from modules.generate_wallets import generate_wallets
+from modules.preflight import check_balances, load_top_up_addresses
+from modules.quests import quest_scheduler
+from modules.rate_limiter import rate_limiter
+from modules.rpc_client import close_sessions
+from modules.simulation import simulator
+from modules.stage_graph import StageGraph, StageTimings
+from modules.stats_store import StatsStore
 from modules.withdraw_from_binance import withdraw_from_binance
-from settings import SHUFFLE_ACCOUNTS, THREADS
-from config import CACHED_USER_AGENTS
+from settings import (
+    CASSETTE_MODE,
+    PREFLIGHT_BALANCES,
+    PREFLIGHT_SKIP_UNDERFUNDED,
+    SHUFFLE_ACCOUNTS,
+    STALLED_DAYS,
+    STATS_DB,
+    STATS_HISTORY_DAYS,
+    WITHDRAW_ONLY_TOP_UP,
+)
 from modules.utils import sleep
 
 
 class Executor:
     def __init__(self, wallets: list[str], proxies: list[str]):
         self.accounts = self._load_accounts(wallets, proxies)
+        self.stage_timings = StageTimings()
 
     async def generate_wallets(self):
         await generate_wallets()
 
     async def withdraw_from_binance(self):
-        for i, account in enumerate(self.accounts, start=1):
+        accounts = self.accounts
+        if WITHDRAW_ONLY_TOP_UP:
+            addresses = load_top_up_addresses(56)
+            if addresses is None:
+                logger.error("No top up list, run StarryNift module first")
+                return
+            accounts = [account for account in accounts if account.address in addresses]
+
+        for i, account in enumerate(accounts, start=1):
             await withdraw_from_binance(address=account.address, proxy=account.proxy)
 
-            if i != len(self.accounts):
+            if i != len(accounts):
                 await sleep(account)
 
     async def run_starrynift(self):
-        groups = self._generate_groups()
+        accounts = self.accounts
+        # Balances come straight from RPC batches, which cassettes don't cover
+        if PREFLIGHT_BALANCES and CASSETTE_MODE != "replay":
+            accounts = await self._check_balances(accounts)
 
         tasks = []
-        for id, group in enumerate(groups):
+        for i, account in enumerate(accounts):
             tasks.append(
                 asyncio.create_task(
-                    self._run_starrynift(group, id),
-                    name=f"group - {id}",
+                    self._run_starrynift(account, i),
+                    name=f"account - {account.id}",
                 )
             )
 
         await asyncio.gather(*tasks)
-
-    async def _run_starrynift(self, group: list[Account], group_id: int):
-        for i, account in enumerate(group):
-            if i != 0 or group_id != 0:
+        await close_sessions()
+        quest_scheduler.save_state()
+
+        self.stage_timings.log_summary()
+        concurrency.log_history()
+        rate_limiter.log_stats()
+        fee_engine.log_stats()
+        simulator.log_stats()
+        quest_scheduler.log_stats()
+
+    async def _run_starrynift(self, account: Account, index: int):
+        async with concurrency:
+            if index != 0:
                 await sleep(account)
 
-            logger.info(f"Running #{account.id} account: {account.address}")
-            if await account.login():
-                if not await account.check_if_pass_is_minted():
-                    if not await account.mint_nft_pass():
-                        continue
+            account.logger.info("Running account")
+            await self._run_account_stages(account)
+            if account.cassette is not None:
+                account.cassette.save()
+
+    async def _check_balances(self, accounts: list[Account]) -> list[Account]:
+        unaffordable = await check_balances(accounts)
+
+        funded = []
+        for account in accounts:
+            account.unaffordable_actions = unaffordable[account.address]
+            if "daily" in account.unaffordable_actions and PREFLIGHT_SKIP_UNDERFUNDED:
+                account.logger.warning("Not enough BNB on BSC, skipping account")
+                continue
+            funded.append(account)
+
+        return funded
+
+    async def _run_account_stages(self, account: Account):
+        graph = StageGraph(account.logger)
+        graph.add("login", account.login)
+        graph.add("raffle_status", account.get_ruffle_info, requires=["login"])
+        graph.add("pass", account.ensure_pass, requires=["login"])
+        graph.add("daily", account.daily_claim, requires=["pass"])
+        if "ruffle" not in account.unaffordable_actions:
+            graph.add(
+                "ruffle",
+                lambda: account.ruffle(graph.results["raffle_status"]),
+                requires=["pass"],
+                # A failed early status fetch is repeated by ruffle itself
+                after=["daily", "raffle_status"],
+            )
+        else:
+            account.logger.warning("Not enough BNB on opBNB, skipping ruffle")
+        graph.add("quests", account.complete_quests, requires=["pass"])
 
-                await account.daily_claim()
-                await account.ruffle()
-                await account.complete_quests()
+        await graph.run()
+        self.stage_timings.add(graph)
 
     async def get_accounts_stats(self):
         stats = {}
         for i, account in enumerate(self.accounts, start=1):
-            logger.info(f"[{account.id}][{account.address}] Getting stats...")
+            account.logger.info("Getting stats...")
             if await account.login():
                 info = await account.get_current_user_info()
                 stats[account.address] = {
@@ -72,31 +139,41 @@ class Executor:
 
         logger.info("Stats saved to data/stats.json")
 
-    def _generate_groups(self):
-        global THREADS
+        store = StatsStore(STATS_DB)
+        store.record(stats)
+        store.close()
+        logger.info(f"Stats history saved to {STATS_DB}")
 
-        if THREADS <= 0:
-            THREADS = 1
-        elif THREADS > len(self.accounts):
-            THREADS = len(self.accounts)
+        rate_limiter.log_stats()
 
-        group_size = len(self.accounts) // THREADS
-        remainder = len(self.accounts) % THREADS
+    async def get_stats_history(self):
+        store = StatsStore(STATS_DB)
 
-        groups = []
-        start = 0
-        for i in range(THREADS):
-            # Add an extra account to some groups to distribute the remainder
-            end = start + group_size + (1 if i < remainder else 0)
-            groups.append(self.accounts[start:end])
-            start = end
+        for day, accounts, levels, xp in store.fleet_totals(STATS_HISTORY_DAYS):
+            logger.info(f"{day} | accounts: {accounts}, levels: {levels}, xp: {xp}")
 
-        return groups
+        stalled = store.stalled_accounts(STALLED_DAYS)
+        for address, user_id, xp in stalled:
+            logger.warning(
+                f"[{address}] No XP progress in {STALLED_DAYS} days | {xp} xp"
+            )
+        logger.info(f"{len(stalled)} accounts without progress in {STALLED_DAYS} days")
+
+        rows = store.export_csv("data/stats_history.csv", STATS_HISTORY_DAYS)
+        store.close()
+        logger.info(f"{rows} rows of stats history saved to data/stats_history.csv")
 
     def _load_accounts(self, wallets: list[str], proxies: list[str]) -> list[Account]:
+        # Read here rather than from config, so benchmarks run without data files
+        try:
+            with open("data/cached_user_agents.json", "r") as f:
+                cached_user_agents = json.load(f)
+        except FileNotFoundError:
+            cached_user_agents = {}
+
         accounts = []
         for i, (wallet, proxy) in enumerate(zip(wallets, proxies), start=1):
-            user_agent = CACHED_USER_AGENTS.get(wallet)
+            user_agent = cached_user_agents.get(wallet)
 
             if user_agent is not None:
                 accounts.append(
@@ -104,13 +181,13 @@ class Executor:
                 )
             else:
                 user_agent = UserAgent(os="windows").random
-                CACHED_USER_AGENTS[wallet] = user_agent
+                cached_user_agents[wallet] = user_agent
                 accounts.append(
                     Account(id=i, key=wallet, proxy=proxy, user_agent=user_agent)
                 )
 
         with open("data/cached_user_agents.json", "w") as f:
-            f.write(json.dumps(CACHED_USER_AGENTS, indent=4))
+            f.write(json.dumps(cached_user_agents, indent=4))
 
         if SHUFFLE_ACCOUNTS:
             random.shuffle(accounts)
@@ -0,0 +1,124 @@
+import asyncio
+import statistics
+import time
+from collections import defaultdict
+
+from loguru import logger
+
+from settings import FEE_CACHE_SECONDS, FEES
+
+
+CHAIN_NAMES = {
+    56: "BSC",
+    204: "opBNB",
+}
+
+
+class ChainFeeStats:
+    def __init__(self):
+        self.latencies = []
+        self.blocks = []
+        self.gas_prices = []
+        self.fees_paid = 0
+        self.replacements = 0
+        self.dropped = 0
+
+
+class FeeEngine:
+    def __init__(self, fees, cache_seconds):
+        self.fees = fees
+        self.cache_seconds = cache_seconds
+        self.cache = {}
+        self.locks = {}
+        self.stats = defaultdict(ChainFeeStats)
+
+    def get_settings(self, chain_id):
+        return self.fees[chain_id]
+
+    async def get_gas_price(self, web3, chain_id):
+        # A price shared between accounts would make the requests in each
+        # account's cassette depend on timing, so recorded runs fetch their own
+        if getattr(web3.provider, "cassette", None) is not None:
+            return await self._fetch_gas_price(web3, chain_id)
+
+        cached = self.cache.get(chain_id)
+        if cached is not None and time.monotonic() - cached[0] < self.cache_seconds:
+            return cached[1]
+
+        # One request per chain refreshes the price for every account waiting on it
+        lock = self.locks.setdefault(chain_id, asyncio.Lock())
+        async with lock:
+            cached = self.cache.get(chain_id)
+            if cached is not None and time.monotonic() - cached[0] < self.cache_seconds:
+                return cached[1]
+
+            gas_price = await self._fetch_gas_price(web3, chain_id)
+            self.cache[chain_id] = (time.monotonic(), gas_price)
+            return gas_price
+
+    async def _fetch_gas_price(self, web3, chain_id):
+        settings = self.get_settings(chain_id)
+        try:
+            history = await web3.eth.fee_history(
+                settings["blocks"], "latest", [settings["percentile"]]
+            )
+            base_fee = history["baseFeePerGas"][-1]
+            rewards = [reward[0] for reward in history["reward"] if reward]
+            gas_price = base_fee + (int(statistics.median(rewards)) if rewards else 0)
+        except Exception as e:
+            logger.warning(f"{CHAIN_NAMES[chain_id]} fee history unavailable | {e}")
+            gas_price = await web3.eth.gas_price
+
+        return self.clamp(chain_id, gas_price)
+
+    def clamp(self, chain_id, gas_price):
+        settings = self.get_settings(chain_id)
+        return max(
+            int(settings["min_gwei"] * 10**9),
+            min(int(gas_price), int(settings["max_gwei"] * 10**9)),
+        )
+
+    async def get_replacement_gas_price(self, web3, chain_id, gas_price):
+        settings = self.get_settings(chain_id)
+        max_gas_price = int(settings["max_gwei"] * 10**9)
+        if gas_price >= max_gas_price:
+            return None
+
+        bumped = gas_price * (100 + settings["bump_percent"]) // 100
+        return min(max(bumped, await self.get_gas_price(web3, chain_id)), max_gas_price)
+
+    def record_inclusion(self, chain_id, latency, blocks, receipt, replacements):
+        stats = self.stats[chain_id]
+        gas_price = receipt.get("effectiveGasPrice", 0)
+        stats.latencies.append(latency)
+        stats.blocks.append(blocks)
+        stats.gas_prices.append(gas_price)
+        stats.fees_paid += receipt["gasUsed"] * gas_price
+        stats.replacements += replacements
+
+    def record_dropped(self, chain_id, replacements):
+        stats = self.stats[chain_id]
+        stats.dropped += 1
+        stats.replacements += replacements
+
+    def log_stats(self):
+        for chain_id, stats in sorted(self.stats.items()):
+            name = CHAIN_NAMES[chain_id]
+            if not stats.latencies:
+                logger.info(f"{name} fees | mined: 0, timed out: {stats.dropped}")
+                continue
+
+            latencies = sorted(stats.latencies)
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            logger.info(
+                f"{name} fees | mined: {len(latencies)}, timed out: {stats.dropped}, "
+                f"replacements: {stats.replacements}, "
+                f"inclusion: median {statistics.median(latencies):.1f}s / "
+                f"p95 {p95:.1f}s / median {statistics.median(stats.blocks)} blocks, "
+                f"gas price: median "
+                f"{statistics.median(stats.gas_prices) / 10**9:.6f} gwei, "
+                f"paid: {stats.fees_paid / 10**18:.6f} BNB"
+            )
+
+
+fee_engine = FeeEngine(FEES, FEE_CACHE_SECONDS)
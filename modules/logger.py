@@ -0,0 +1,125 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+from loguru import logger
+
+from modules.profiler import profiler
+from settings import LOG_FILE, LOG_FILE_LEVEL, LOG_LEVEL, LOG_SAMPLING
+
+
+# extra keys mapped to short names in the machine log
+JSON_FIELDS = {
+    "account_id": "acc",
+    "address": "addr",
+    "stage": "stage",
+    "duration": "dur",
+}
+
+
+class JsonSink:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+        atexit.register(self.file.close)
+
+    def __call__(self, message):
+        record = message.record
+        data = {
+            "ts": round(record["time"].timestamp(), 3),
+            "lvl": record["level"].name,
+            "msg": record["message"],
+        }
+        for key, value in record["extra"].items():
+            if key == "sample":
+                continue
+            data[JSON_FIELDS.get(key, key)] = value
+        if record["exception"] is not None:
+            data["exc"] = repr(record["exception"].value)
+
+        self.file.write(json.dumps(data, separators=(",", ":"), default=str) + "\n")
+        self.file.flush()
+
+
+WARNING_LEVEL = logger.level("WARNING").no
+
+
+class SamplingFilter:
+    def __init__(self, rates):
+        self.rates = rates
+        self.counters = defaultdict(int)
+
+    def __call__(self, record):
+        key = record["extra"].get("sample")
+        rate = self.rates.get(key)
+        if rate is None or record["level"].no >= WARNING_LEVEL:
+            return True
+
+        self.counters[key] += 1
+        return (self.counters[key] - 1) % rate == 0
+
+
+def console_format(record):
+    prefix = ""
+    if "address" in record["extra"]:
+        prefix = "[{extra[account_id]}][{extra[address]}] "
+    return (
+        "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
+        "<level>{level: <8}</level> | "
+        f"<level>{prefix}{{message}}</level>\n{{exception}}"
+    )
+
+
+def setup_logger():
+    logger.remove()
+    logger.add(
+        sys.stderr,
+        level=LOG_LEVEL,
+        format=console_format,
+        filter=SamplingFilter(LOG_SAMPLING),
+        enqueue=True,
+        # Tracebacks with local values would print private keys on every retry
+        backtrace=False,
+        diagnose=False,
+    )
+    if LOG_FILE:
+        logger.add(
+            JsonSink(LOG_FILE),
+            level=LOG_FILE_LEVEL,
+            format="{message}",
+            filter=SamplingFilter(LOG_SAMPLING),
+            enqueue=True,
+            backtrace=False,
+            diagnose=False,
+        )
+
+
+def account_logger(account):
+    return logger.bind(account_id=account.id, address=account.address)
+
+
+def stage(name):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            with logger.contextualize(
+                account_id=self.id, address=self.address, stage=name
+            ):
+                start = time.perf_counter()
+                coro = func(self, *args, **kwargs)
+                if profiler.active:
+                    coro = profiler.track(name, coro)
+                try:
+                    return await coro
+                finally:
+                    logger.bind(duration=round(time.perf_counter() - start, 3)).debug(
+                        f"Stage {name} finished"
+                    )
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,160 @@
+import asyncio
+import csv
+
+import aiohttp
+from loguru import logger
+from web3 import AsyncWeb3
+from web3.middleware import async_geth_poa_middleware
+
+from modules.fee_engine import CHAIN_NAMES, fee_engine
+from modules.rate_limiter import ThrottledHTTPProvider, parse_retry_after, rate_limiter
+from modules.tx_templates import DAILY_GAS_LIMIT, MINT_GAS_LIMIT, RUFFLE_GAS_LIMIT
+from modules.utils import retry
+from settings import (
+    BALANCE_BATCH_SIZE,
+    BNB_RPC,
+    DISABLE_SSL,
+    OPBNB_RPC,
+    PREFLIGHT_GAS_MARGIN,
+    RATE_LIMIT_RETRIES,
+)
+
+
+TOP_UP_FILE = "data/top_up.csv"
+
+# Actions of a regular run on each chain in the order they spend gas. An action is
+# affordable when the balance covers its gas and the gas of the actions after it,
+# so mint is checked against mint + daily check in
+PREFLIGHT_CHAINS = {
+    56: (BNB_RPC, [("mint", MINT_GAS_LIMIT), ("daily", DAILY_GAS_LIMIT)]),
+    204: (OPBNB_RPC, [("ruffle", RUFFLE_GAS_LIMIT)]),
+}
+
+
+@retry
+async def get_balances_batch(session, rpc, addresses):
+    payload = [
+        {
+            "jsonrpc": "2.0",
+            "id": i,
+            "method": "eth_getBalance",
+            "params": [address, "latest"],
+        }
+        for i, address in enumerate(addresses)
+    ]
+    kwargs = {"ssl": False} if DISABLE_SSL else {}
+
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        await rate_limiter.acquire(rpc, "rpc")
+        response = await session.post(rpc, json=payload, **kwargs)
+        if response.status != 429 or attempt == RATE_LIMIT_RETRIES:
+            break
+        response.release()
+        rate_limiter.penalize(
+            rpc, parse_retry_after(response.headers.get("Retry-After")), "rpc"
+        )
+
+    if response.status != 200:
+        raise RuntimeError(f"Error while getting balances | {await response.text()}")
+
+    results = await response.json(content_type=None)
+    if not isinstance(results, list):
+        raise RuntimeError(f"RPC doesn't support batch requests | {results}")
+
+    balances = {}
+    for result in results:
+        if "result" not in result:
+            raise RuntimeError(f"Error while getting balances | {result}")
+        balances[addresses[result["id"]]] = int(result["result"], 16)
+    return balances
+
+
+async def get_balances(rpc, addresses):
+    async with aiohttp.ClientSession() as session:
+        batches = await asyncio.gather(
+            *[
+                get_balances_batch(session, rpc, addresses[i : i + BALANCE_BATCH_SIZE])
+                for i in range(0, len(addresses), BALANCE_BATCH_SIZE)
+            ]
+        )
+
+    balances = {}
+    for batch in batches:
+        # Failed batches stay unknown so their accounts are not excluded by mistake
+        balances.update(batch or {})
+    return balances
+
+
+async def check_balances(accounts):
+    addresses = [account.address for account in accounts]
+    unaffordable = {account.address: set() for account in accounts}
+    rows = []
+
+    for chain_id, (rpc, actions) in PREFLIGHT_CHAINS.items():
+        web3 = AsyncWeb3(
+            ThrottledHTTPProvider(rpc),
+            middlewares=[async_geth_poa_middleware],
+        )
+        gas_price = await fee_engine.get_gas_price(web3, chain_id)
+        required = {}
+        gas_limit = 0
+        for action, action_gas_limit in reversed(actions):
+            gas_limit += action_gas_limit
+            required[action] = int(gas_limit * gas_price * PREFLIGHT_GAS_MARGIN)
+        # The first action needs the most, top up covers the whole run
+        top_up = required[actions[0][0]]
+        covered = "+".join(action for action, _ in actions)
+        balances = await get_balances(rpc, addresses)
+
+        for address in addresses:
+            balance = balances.get(address)
+            if balance is None or balance >= top_up:
+                continue
+            unaffordable[address].update(
+                action for action, amount in required.items() if balance < amount
+            )
+            rows.append(
+                [
+                    address,
+                    CHAIN_NAMES[chain_id],
+                    covered,
+                    AsyncWeb3.from_wei(balance, "ether"),
+                    AsyncWeb3.from_wei(top_up, "ether"),
+                    AsyncWeb3.from_wei(top_up - balance, "ether"),
+                ]
+            )
+
+        counts = ", ".join(
+            f"{sum(action in actions for actions in unaffordable.values())} "
+            f"can't afford {action} ({AsyncWeb3.from_wei(amount, 'ether')} BNB)"
+            for action, amount in reversed(required.items())
+        )
+        logger.info(
+            f"{CHAIN_NAMES[chain_id]} balances | {len(balances)}/{len(addresses)} "
+            f"checked, {counts}"
+        )
+
+    with open(TOP_UP_FILE, "w", newline="") as f:
+        writer = csv.writer(f)
+        # required covers every action of the chain listed in the actions column
+        writer.writerow(
+            ["address", "chain", "actions", "balance", "required", "missing"]
+        )
+        writer.writerows(rows)
+
+    if rows:
+        logger.warning(f"{len(rows)} balances need top up, saved to {TOP_UP_FILE}")
+
+    return unaffordable
+
+
+def load_top_up_addresses(chain_id):
+    try:
+        with open(TOP_UP_FILE, "r") as f:
+            return {
+                row["address"]
+                for row in csv.DictReader(f)
+                if row["chain"] == CHAIN_NAMES[chain_id]
+            }
+    except FileNotFoundError:
+        return None
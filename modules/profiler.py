@@ -0,0 +1,230 @@
+import asyncio
+import cProfile
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict
+
+from loguru import logger
+
+from settings import (
+    PROFILE_ASYNCIO_DEBUG,
+    PROFILE_BLOCKED_THRESHOLD,
+    PROFILE_CPROFILE,
+    PROFILE_DIR,
+    PROFILE_LAG_INTERVAL,
+    PROFILE_SAMPLE_INTERVAL,
+)
+
+
+# Leaf frames of an event loop waiting for I/O
+IDLE_FRAMES = {"select", "poll", "epoll", "kqueue", "run_once"}
+MAX_STACK_DEPTH = 128
+
+
+def install_uvloop():
+    try:
+        import uvloop
+    except ImportError:
+        logger.warning("uvloop is not installed, using default event loop")
+        return False
+
+    uvloop.install()
+    logger.info("Using uvloop event loop")
+    return True
+
+
+class InterceptHandler(logging.Handler):
+    def emit(self, record):
+        logger.opt(depth=6).log(record.levelname, record.getMessage())
+
+
+class CpuTimed:
+    def __init__(self, coro, name, cpu_times, calls):
+        self.coro = coro
+        self.name = name
+        self.cpu_times = cpu_times
+        self.calls = calls
+
+    def __await__(self):
+        # Only the steps this coroutine runs on the loop are counted, not the waits
+        self.calls[self.name] += 1
+        steps = self.coro.__await__()
+        value, error = None, None
+        while True:
+            start = time.thread_time()
+            try:
+                if error is not None:
+                    item = steps.throw(error)
+                else:
+                    item = steps.send(value)
+            except StopIteration as e:
+                return e.value
+            finally:
+                self.cpu_times[self.name] += time.thread_time() - start
+
+            try:
+                value, error = (yield item), None
+            except BaseException as e:
+                value, error = None, e
+
+
+class Profiler:
+    def __init__(self):
+        self.active = False
+        self.loop = None
+        self.loop_thread_id = None
+        self.started = None
+
+        self.lags = []
+        self.heartbeat = time.monotonic()
+        self.lag_task = None
+
+        self.stacks = Counter()
+        self.stalls = 0
+        self.sampler = None
+        self.stop_event = threading.Event()
+
+        self.cpu_times = defaultdict(float)
+        self.calls = Counter()
+        self.cprofile = None
+
+    def track(self, name, coro):
+        return CpuTimed(coro, name, self.cpu_times, self.calls)
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.active = True
+
+        # Time between import and start, like the menu prompt, is not loop lag
+        self.heartbeat = time.monotonic()
+        self.stacks.clear()
+        self.lags = []
+        self.stalls = 0
+        self.stop_event.clear()
+
+        if PROFILE_ASYNCIO_DEBUG:
+            # Debug mode adds its own overhead, so it's opt-in
+            self.loop.set_debug(True)
+            self.loop.slow_callback_duration = PROFILE_BLOCKED_THRESHOLD
+            logging.getLogger("asyncio").addHandler(InterceptHandler())
+
+        self.lag_task = self.loop.create_task(self._sample_lag(), name="profiler lag")
+        self.sampler = threading.Thread(
+            target=self._sample_stacks, name="profiler sampler", daemon=True
+        )
+        self.sampler.start()
+
+        if PROFILE_CPROFILE:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+        logger.info(f"Profiling enabled, results will be saved to {PROFILE_DIR}")
+
+    async def stop(self):
+        if not self.active:
+            return
+        self.active = False
+
+        if self.cprofile is not None:
+            self.cprofile.disable()
+
+        self.lag_task.cancel()
+        self.stop_event.set()
+        self.sampler.join()
+
+        self._save()
+        self._log_summary()
+
+    async def _sample_lag(self):
+        while True:
+            start = self.loop.time()
+            await asyncio.sleep(PROFILE_LAG_INTERVAL)
+            self.heartbeat = time.monotonic()
+            self.lags.append(self.loop.time() - start - PROFILE_LAG_INTERVAL)
+
+    def _sample_stacks(self):
+        stalled = False
+        while not self.stop_event.wait(PROFILE_SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+
+            self.stacks[self._collapse(frame)] += 1
+
+            blocked_for = time.monotonic() - self.heartbeat
+            if blocked_for > PROFILE_BLOCKED_THRESHOLD + PROFILE_LAG_INTERVAL:
+                if not stalled:
+                    stalled = True
+                    self.stalls += 1
+                    logger.warning(
+                        f"Event loop blocked for {blocked_for:.2f}s at:\n"
+                        + "".join(traceback.format_stack(frame))
+                    )
+            else:
+                stalled = False
+
+    def _collapse(self, frame):
+        names = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _save(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+
+        # Collapsed stacks, accepted by flamegraph.pl, speedscope and inferno
+        with open(os.path.join(PROFILE_DIR, "stacks.folded"), "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(os.path.join(PROFILE_DIR, "cprofile.prof"))
+
+    def _log_summary(self):
+        elapsed = time.perf_counter() - self.started
+        samples = sum(self.stacks.values())
+
+        if self.lags:
+            lags = sorted(self.lags)
+            p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+            logger.info(
+                f"Event loop lag | median {statistics.median(lags) * 1000:.1f}ms, "
+                f"p99 {p99 * 1000:.1f}ms, max {lags[-1] * 1000:.1f}ms, "
+                f"stalls over {PROFILE_BLOCKED_THRESHOLD}s: {self.stalls}"
+            )
+
+        if samples:
+            leaves = Counter()
+            for stack, count in self.stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            idle = sum(
+                count
+                for leaf, count in leaves.items()
+                if leaf.rsplit(":", 1)[-1] in IDLE_FRAMES
+            )
+            logger.info(
+                f"Event loop busy {(samples - idle) / samples:.0%} of {elapsed:.0f}s "
+                f"({samples} samples)"
+            )
+            for leaf, count in leaves.most_common(10):
+                logger.info(f"{count / samples:6.1%} | {leaf}")
+
+        for name, cpu_time in sorted(
+            self.cpu_times.items(), key=lambda x: x[1], reverse=True
+        ):
+            logger.info(
+                f"Stage {name} | CPU {cpu_time:.2f}s in {self.calls[name]} calls, "
+                f"{cpu_time / self.calls[name] * 1000:.1f}ms per call"
+            )
+
+
+profiler = Profiler()
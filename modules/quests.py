@@ -0,0 +1,197 @@
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import time
+from collections import Counter
+
+from loguru import logger
+
+from settings import CACHE_QUEST_STATE
+
+
+QUEST_STATE_FILE = "data/quest_state.json"
+
+
+def get_quest_day():
+    # Daily quests reset at midnight UTC
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d")
+
+
+class QuestHandler:
+    def __init__(self, name, func, cost, duration, resources):
+        self.name = name
+        self.func = func
+        # API requests and seconds one completion is expected to take
+        self.cost = cost
+        self.duration = duration
+        # Quests sharing a resource never run at the same time for one account
+        self.resources = tuple(sorted(resources))
+
+
+quest_handlers = {}
+
+
+def quest(name, cost, duration, resources=()):
+    def decorator(func):
+        quest_handlers[name] = QuestHandler(name, func, cost, duration, resources)
+        return func
+
+    return decorator
+
+
+class QuestStateCache:
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, "r") as f:
+                self.states = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.states = {}
+        self.changed = False
+
+    def get(self, address):
+        state = self.states.get(address)
+        if state is None or state["day"] != get_quest_day():
+            return None
+        return state["quests"]
+
+    def set(self, address, quests):
+        self.states[address] = {"day": get_quest_day(), "quests": quests}
+        self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+
+        day = get_quest_day()
+        self.states = {
+            address: state
+            for address, state in self.states.items()
+            if state["day"] == day
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w") as f:
+            f.write(json.dumps(self.states, indent=4))
+        self.changed = False
+
+
+class QuestScheduler:
+    def __init__(self, handlers, cache):
+        self.handlers = handlers
+        self.cache = cache
+        self.started = None
+
+        self.completed = Counter()
+        self.failed = Counter()
+        self.fetches_skipped = 0
+
+    def is_done(self, quests):
+        # Quests without a handler can't be completed, so they don't count
+        return all(
+            completed or name not in self.handlers
+            for name, completed in quests.items()
+        )
+
+    async def run(self, account):
+        if self.started is None:
+            self.started = time.monotonic()
+
+        # Replayed runs neither trust nor update the state of the real accounts
+        cache = self.cache
+        if account.cassette is not None and account.cassette.replaying:
+            cache = None
+
+        quests = cache.get(account.address) if cache is not None else None
+        if quests is not None and self.is_done(quests):
+            self.fetches_skipped += 1
+            account.logger.info("All quests already completed today")
+            return
+
+        items = await account.get_quests()
+        if items is None:
+            return
+        quests = {item["name"]: item["completed"] for item in items}
+
+        pending = []
+        for name, completed in quests.items():
+            if completed:
+                account.logger.info(f"{name} Quest Already Completed")
+            elif name not in self.handlers:
+                account.logger.warning(f"Quest {name} is not supported")
+            else:
+                pending.append(self.handlers[name])
+
+        # Longest first, so they start before short ones take shared resources
+        pending.sort(key=lambda handler: (-handler.duration, handler.cost))
+        if pending:
+            account.logger.info(
+                f"Running {len(pending)} quests | "
+                f"~{sum(handler.cost for handler in pending)} requests, "
+                f"~{max(handler.duration for handler in pending)}s"
+            )
+
+        locks = {
+            resource: asyncio.Lock()
+            for handler in pending
+            for resource in handler.resources
+        }
+        results = await asyncio.gather(
+            *[self._run_quest(account, handler, locks) for handler in pending]
+        )
+        for handler, completed in zip(pending, results):
+            quests[handler.name] = completed
+
+        if cache is not None:
+            cache.set(account.address, quests)
+
+    def save_state(self):
+        # Written once per run, accounts only update the state in memory
+        if self.cache is not None:
+            self.cache.save()
+
+    async def _run_quest(self, account, handler, locks):
+        async with contextlib.AsyncExitStack() as stack:
+            for resource in handler.resources:
+                await stack.enter_async_context(locks[resource])
+
+            account.logger.info(f"Completing quest: {handler.name}")
+            try:
+                result = await handler.func(account)
+            except RuntimeError as e:
+                self.failed[handler.name] += 1
+                account.logger.error(f"{handler.name} Quest Failed | {e}")
+                return False
+
+        # retry returns None once all attempts have failed
+        if result is False or result is None:
+            self.failed[handler.name] += 1
+            account.logger.error(f"{handler.name} Quest Failed")
+            return False
+
+        self.completed[handler.name] += 1
+        account.logger.success(f"{handler.name} Quest Completed")
+        return True
+
+    def log_stats(self):
+        if self.started is None:
+            return
+
+        hours = max(time.monotonic() - self.started, 1) / 3600
+        completed = sum(self.completed.values())
+        per_quest = ", ".join(
+            f"{name}: {self.completed[name]}/{self.completed[name] + self.failed[name]}"
+            for name in sorted({*self.completed, *self.failed})
+        )
+        logger.info(
+            f"Quests | completed: {completed}, failed: {sum(self.failed.values())}, "
+            f"{completed / hours:.0f}/hour, "
+            f"fetches skipped: {self.fetches_skipped}"
+            + (f" | {per_quest}" if per_quest else "")
+        )
+
+
+quest_scheduler = QuestScheduler(
+    quest_handlers, QuestStateCache(QUEST_STATE_FILE) if CACHE_QUEST_STATE else None
+)
@@ -0,0 +1,205 @@
+import asyncio
+import email.utils
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import aiohttp
+from loguru import logger
+from web3 import AsyncWeb3
+
+from modules.concurrency import concurrency
+from settings import DEFAULT_RATE_LIMIT, RATE_LIMIT_RETRIES, RATE_LIMITS
+
+
+# Path prefixes of api.starrynift.art grouped by the budget they share
+ENDPOINT_CLASSES = (
+    ("/api-v2/starryverse/auth/", "auth"),
+    ("/api-v2/webhook/", "webhook"),
+    ("/api-v2/space/online/ping", "ping"),
+)
+
+# Share of the configured rate restored per second after a 429 penalty
+RATE_RECOVERY_PER_SECOND = 1 / 60
+MIN_RATE_SHARE = 0.05
+DEFAULT_RETRY_AFTER = 5
+
+
+def get_endpoint_class(url):
+    path = urlparse(url).path
+    for prefix, endpoint_class in ENDPOINT_CLASSES:
+        if path.startswith(prefix):
+            return endpoint_class
+    return "default"
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - time.time(), 0)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self.lock = None
+
+        self.requests = 0
+        self.throttled_time = 0
+        self.idle_time = 0
+        self.rate_limited = 0
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.updated = now
+        if elapsed <= 0:
+            return
+
+        if now >= self.blocked_until and self.rate < self.max_rate:
+            self.rate = min(
+                self.max_rate,
+                self.rate + self.max_rate * RATE_RECOVERY_PER_SECOND * elapsed,
+            )
+
+        missing = self.capacity - self.tokens
+        time_to_fill = missing / self.rate
+        if elapsed > time_to_fill:
+            # Bucket was full for the rest of the interval - capacity went unused
+            self.idle_time += elapsed - time_to_fill
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+
+    async def acquire(self):
+        # Created lazily so the lock binds to the running event loop
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+
+                wait = max(self.blocked_until - now, 0)
+                if wait == 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.requests += 1
+                    return
+
+                wait = max(wait, (1 - self.tokens) / self.rate)
+                self.throttled_time += wait
+                await asyncio.sleep(wait)
+
+    def penalize(self, retry_after):
+        now = time.monotonic()
+        self._refill(now)
+
+        self.rate_limited += 1
+        self.rate = max(self.rate / 2, self.max_rate * MIN_RATE_SHARE)
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+
+
+class RateLimiter:
+    def __init__(self, limits, default_limit):
+        self.limits = limits
+        self.default_limit = default_limit
+        self.buckets = {}
+        self.started = time.monotonic()
+
+    def get_bucket(self, host, endpoint_class):
+        key = (host, endpoint_class)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            rate, capacity = self.limits.get(key, self.default_limit)
+            bucket = self.buckets[key] = TokenBucket(rate, capacity)
+        return bucket
+
+    def get_url_bucket(self, url, endpoint_class=None):
+        return self.get_bucket(
+            urlparse(url).hostname, endpoint_class or get_endpoint_class(url)
+        )
+
+    async def acquire(self, url, endpoint_class=None):
+        await self.get_url_bucket(url, endpoint_class).acquire()
+
+    def penalize(self, url, retry_after=None, endpoint_class=None):
+        if retry_after is None:
+            retry_after = DEFAULT_RETRY_AFTER
+
+        bucket = self.get_url_bucket(url, endpoint_class)
+        bucket.penalize(retry_after)
+        logger.warning(
+            f"Rate limited by {urlparse(url).hostname} | "
+            f"backing off for {retry_after:.1f}s, "
+            f"rate lowered to {bucket.rate:.2f} req/s"
+        )
+
+    def log_stats(self):
+        elapsed = time.monotonic() - self.started
+        hosts = defaultdict(list)
+        for (host, endpoint_class), bucket in self.buckets.items():
+            hosts[host].append((endpoint_class, bucket))
+
+        logger.info(f"Rate limiter stats for {elapsed:.0f}s run:")
+        for host, buckets in sorted(hosts.items()):
+            for endpoint_class, bucket in sorted(buckets, key=lambda x: x[0]):
+                bucket._refill(time.monotonic())
+                logger.info(
+                    f"{host} [{endpoint_class}] | requests: {bucket.requests}, "
+                    f"throttled: {bucket.throttled_time:.1f}s, "
+                    f"idle: {bucket.idle_time:.1f}s, "
+                    f"429s: {bucket.rate_limited}, "
+                    f"rate: {bucket.rate:.2f}/{bucket.max_rate} req/s"
+                )
+
+
+rate_limiter = RateLimiter(RATE_LIMITS, DEFAULT_RATE_LIMIT)
+
+
+class ThrottledHTTPProvider(AsyncWeb3.AsyncHTTPProvider):
+    cassette = None
+
+    async def make_request(self, method, params):
+        if self.cassette is not None and self.cassette.replaying:
+            return await self.cassette.replay_rpc(self.endpoint_uri, method)
+
+        endpoint = (self.endpoint_uri, method)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            await rate_limiter.acquire(self.endpoint_uri, "rpc")
+            start = time.perf_counter()
+            try:
+                response = await super().make_request(method, params)
+            except aiohttp.ClientResponseError as e:
+                overloaded = e.status == 429 or e.status >= 500
+                concurrency.observe(endpoint, time.perf_counter() - start, overloaded)
+                if e.status != 429 or attempt == RATE_LIMIT_RETRIES:
+                    raise
+                rate_limiter.penalize(
+                    self.endpoint_uri,
+                    parse_retry_after((e.headers or {}).get("Retry-After")),
+                    "rpc",
+                )
+                continue
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                concurrency.observe(endpoint, time.perf_counter() - start, True)
+                raise
+
+            latency = time.perf_counter() - start
+            concurrency.observe(endpoint, latency)
+            if self.cassette is not None:
+                self.cassette.record_rpc(
+                    self.endpoint_uri, method, params, response, latency
+                )
+            return response
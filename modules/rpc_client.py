@@ -0,0 +1,174 @@
+import asyncio
+import itertools
+import time
+
+import aiohttp
+
+from modules.concurrency import concurrency
+from modules.rate_limiter import parse_retry_after, rate_limiter
+from settings import DISABLE_SSL, RATE_LIMIT_RETRIES
+
+
+# Receipt fields returned as integers, the rest are left as hex strings
+RECEIPT_QUANTITIES = (
+    "blockNumber",
+    "cumulativeGasUsed",
+    "effectiveGasPrice",
+    "gasUsed",
+    "status",
+    "transactionIndex",
+    "type",
+)
+
+# One keep-alive connection pool per RPC, shared by all accounts
+sessions = {}
+
+
+class RPCError(RuntimeError):
+    def __init__(self, method, error):
+        self.code = error.get("code")
+        self.message = error.get("message")
+        self.data = error.get("data")
+        super().__init__(f"{method} failed | {self.code}: {self.message}")
+
+
+class RPCReverted(RPCError):
+    pass
+
+
+def to_int(value):
+    return int(value, 16)
+
+
+def decode_receipt(receipt):
+    if receipt is None:
+        return None
+    decoded = dict(receipt)
+    for key in RECEIPT_QUANTITIES:
+        if decoded.get(key) is not None:
+            decoded[key] = to_int(decoded[key])
+    return decoded
+
+
+def get_session(endpoint):
+    session = sessions.get(endpoint)
+    if session is None or session.closed:
+        session = sessions[endpoint] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(ssl=False if DISABLE_SSL else None),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+    return session
+
+
+async def close_sessions():
+    for session in sessions.values():
+        await session.close()
+    sessions.clear()
+
+
+class RPCClient:
+    def __init__(self, endpoint, cassette=None):
+        self.endpoint = endpoint
+        self.cassette = cassette
+        self.ids = itertools.count()
+
+    async def request(self, method, params):
+        return (await self.batch([(method, params)]))[0]
+
+    async def batch(self, calls):
+        if self.cassette is not None and self.cassette.replaying:
+            responses = await asyncio.gather(
+                *[
+                    self.cassette.replay_rpc(self.endpoint, method)
+                    for method, _ in calls
+                ]
+            )
+        else:
+            responses = await self._post(calls)
+
+        results = []
+        for (method, _), response in zip(calls, responses):
+            error = response.get("error")
+            if error is not None:
+                if "revert" in (error.get("message") or "") or error.get("code") == 3:
+                    raise RPCReverted(method, error)
+                raise RPCError(method, error)
+            results.append(response.get("result"))
+        return results
+
+    async def _post(self, calls):
+        payload = [
+            {"jsonrpc": "2.0", "id": next(self.ids), "method": method, "params": params}
+            for method, params in calls
+        ]
+        # Batches are tracked under their first method, usually the one that matters
+        endpoint = (self.endpoint, calls[0][0])
+        session = get_session(self.endpoint)
+
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            await rate_limiter.acquire(self.endpoint, "rpc")
+            start = time.perf_counter()
+            try:
+                response = await session.post(
+                    self.endpoint, json=payload[0] if len(payload) == 1 else payload
+                )
+                if response.status == 429 and attempt != RATE_LIMIT_RETRIES:
+                    response.release()
+                    concurrency.observe(endpoint, time.perf_counter() - start, True)
+                    rate_limiter.penalize(
+                        self.endpoint,
+                        parse_retry_after(response.headers.get("Retry-After")),
+                        "rpc",
+                    )
+                    continue
+                response.raise_for_status()
+                body = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                concurrency.observe(endpoint, time.perf_counter() - start, True)
+                raise
+
+            latency = time.perf_counter() - start
+            concurrency.observe(endpoint, latency)
+            break
+
+        if isinstance(body, dict):
+            body = [body]
+        # Servers may answer a batch in any order
+        by_id = {
+            response.get("id"): response
+            for response in body
+            if isinstance(response, dict)
+        }
+        try:
+            responses = [by_id[request["id"]] for request in payload]
+        except KeyError:
+            raise RuntimeError(f"Unexpected RPC response | {body}")
+
+        if self.cassette is not None:
+            for (method, params), response in zip(calls, responses):
+                self.cassette.record_rpc(
+                    self.endpoint, method, params, response, latency
+                )
+        return responses
+
+    async def call(self, transaction, block="latest"):
+        return await self.request("eth_call", [transaction, block])
+
+    async def send_raw_transaction(self, raw_transaction):
+        return await self.request(
+            "eth_sendRawTransaction", ["0x" + bytes(raw_transaction).hex()]
+        )
+
+    async def get_transaction_receipt(self, tx_hash):
+        return decode_receipt(
+            await self.request("eth_getTransactionReceipt", [tx_hash])
+        )
+
+    async def get_transaction_count(self, address, block="latest"):
+        return to_int(await self.request("eth_getTransactionCount", [address, block]))
+
+    async def gas_price(self):
+        return to_int(await self.request("eth_gasPrice", []))
+
+    async def block_number(self):
+        return to_int(await self.request("eth_blockNumber", []))
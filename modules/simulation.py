@@ -0,0 +1,129 @@
+import statistics
+from collections import defaultdict
+
+from eth_abi import decode
+from eth_utils import function_signature_to_4byte_selector
+from loguru import logger
+
+from modules.fee_engine import CHAIN_NAMES, fee_engine
+from modules.rpc_client import RPCReverted
+from modules.utils import NonRetryableError
+from settings import MAX_SLEEP, MIN_SLEEP, RETRIES
+
+
+ERROR_SELECTOR = "08c379a0"
+PANIC_SELECTOR = "4e487b71"
+
+PANIC_CODES = {
+    0x01: "assertion failed",
+    0x11: "arithmetic overflow",
+    0x12: "division by zero",
+    0x21: "invalid enum value",
+    0x32: "array index out of bounds",
+}
+
+# Custom errors of the OpenZeppelin contracts StarryNift builds on
+KNOWN_ERRORS = {
+    function_signature_to_4byte_selector(signature).hex(): signature
+    for signature in (
+        "ECDSAInvalidSignature()",
+        "ECDSAInvalidSignatureLength(uint256)",
+        "ECDSAInvalidSignatureS(bytes32)",
+        "InvalidAccountNonce(address,uint256)",
+        "OwnableUnauthorizedAccount(address)",
+        "ERC721InvalidReceiver(address)",
+        "ERC721InvalidSender(address)",
+        "ReentrancyGuardReentrantCall()",
+        "EnforcedPause()",
+    )
+}
+
+# Wait used for time saved when no transaction has been mined on the chain yet
+DEFAULT_INCLUSION_TIME = 10
+
+
+class TransactionReverted(NonRetryableError):
+    pass
+
+
+def decode_revert(error):
+    data = error.data if isinstance(error.data, str) else None
+    if not data or len(data) < 10:
+        return error.message or "execution reverted"
+
+    selector, payload = data[2:10], bytes.fromhex(data[10:])
+    try:
+        if selector == ERROR_SELECTOR:
+            return decode(["string"], payload)[0]
+        if selector == PANIC_SELECTOR:
+            code = decode(["uint256"], payload)[0]
+            return f"panic: {PANIC_CODES.get(code, hex(code))}"
+    except Exception:
+        pass
+
+    return KNOWN_ERRORS.get(selector, f"custom error 0x{selector}")
+
+
+class SimulationStats:
+    def __init__(self):
+        self.simulated = 0
+        self.avoided = 0
+        self.time_saved = 0
+        self.gas_saved = 0
+        self.reasons = defaultdict(int)
+
+
+class Simulator:
+    def __init__(self):
+        self.stats = defaultdict(SimulationStats)
+
+    async def simulate(self, rpc, transaction):
+        chain_id = transaction["chainId"]
+        stats = self.stats[chain_id]
+        try:
+            await rpc.call(
+                {
+                    "from": transaction["from"],
+                    "to": transaction["to"],
+                    "data": transaction["data"],
+                    "gas": hex(transaction["gas"]),
+                }
+            )
+            stats.simulated += 1
+        except RPCReverted as e:
+            stats.simulated += 1
+            reason = decode_revert(e)
+            self._record_avoided(stats, chain_id, transaction, reason)
+            raise TransactionReverted(f"Transaction would revert: {reason}")
+        except Exception as e:
+            # Simulation is best effort, RPC errors must not block sending
+            logger.warning(f"Simulation failed, sending anyway | {e}")
+
+    def _record_avoided(self, stats, chain_id, transaction, reason):
+        latencies = fee_engine.stats[chain_id].latencies
+        inclusion_time = (
+            statistics.median(latencies) if latencies else DEFAULT_INCLUSION_TIME
+        )
+        # Each retry would have waited for the receipt and slept before trying again
+        retry_time = RETRIES * (inclusion_time + (MIN_SLEEP + MAX_SLEEP) / 2)
+
+        stats.avoided += 1
+        stats.time_saved += inclusion_time + retry_time
+        stats.gas_saved += transaction["gas"] * transaction["gasPrice"]
+        stats.reasons[reason] += 1
+
+    def log_stats(self):
+        for chain_id, stats in sorted(self.stats.items()):
+            reasons = ", ".join(
+                f"{reason}: {count}" for reason, count in stats.reasons.items()
+            )
+            logger.info(
+                f"{CHAIN_NAMES[chain_id]} simulation | simulated: {stats.simulated}, "
+                f"avoided: {stats.avoided}, "
+                f"time saved: ~{stats.time_saved:.0f}s, "
+                f"gas saved: up to {stats.gas_saved / 10**18:.6f} BNB"
+                + (f" | {reasons}" if reasons else "")
+            )
+
+
+simulator = Simulator()
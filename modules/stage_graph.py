@@ -0,0 +1,94 @@
+import asyncio
+import statistics
+import time
+from collections import defaultdict
+
+from loguru import logger
+
+
+class Stage:
+    def __init__(self, name, func, requires=(), after=()):
+        self.name = name
+        self.func = func
+        # Stages that must succeed (return a truthy result) before this one runs
+        self.requires = tuple(requires)
+        # Stages that only have to finish first, whatever their result
+        self.after = tuple(after)
+
+
+class StageGraph:
+    def __init__(self, log=logger):
+        self.log = log
+        self.stages = {}
+        self.results = {}
+        self.timings = {}
+        self.skipped = []
+        self.duration = 0
+
+    def add(self, name, func, requires=(), after=()):
+        for dependency in (*requires, *after):
+            if dependency not in self.stages:
+                raise ValueError(f"Unknown stage dependency: {dependency}")
+        self.stages[name] = Stage(name, func, requires, after)
+
+    async def run(self):
+        start = time.perf_counter()
+        tasks = {}
+        for name, stage in self.stages.items():
+            tasks[name] = asyncio.create_task(self._run_stage(stage, tasks))
+
+        await asyncio.gather(*tasks.values())
+        self.duration = time.perf_counter() - start
+        return self.results
+
+    async def _run_stage(self, stage, tasks):
+        for dependency in stage.after:
+            await tasks[dependency]
+
+        for dependency in stage.requires:
+            await tasks[dependency]
+            if not self.results.get(dependency):
+                self.skipped.append(stage.name)
+                self.results[stage.name] = None
+                return
+
+        start = time.perf_counter()
+        try:
+            self.results[stage.name] = await stage.func()
+        except Exception as e:
+            self.log.error(f"Stage {stage.name} failed | {e}")
+            self.results[stage.name] = False
+        finally:
+            self.timings[stage.name] = time.perf_counter() - start
+
+
+class StageTimings:
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.skipped = defaultdict(int)
+        self.durations = []
+
+    def add(self, graph):
+        for name, duration in graph.timings.items():
+            self.timings[name].append(duration)
+        for name in graph.skipped:
+            self.skipped[name] += 1
+        self.durations.append(graph.duration)
+
+    def log_summary(self):
+        if not self.durations:
+            return
+
+        logger.info(
+            f"Stage timings for {len(self.durations)} accounts | "
+            f"account median {statistics.median(self.durations):.1f}s, "
+            f"max {max(self.durations):.1f}s"
+        )
+        for name in dict.fromkeys([*self.timings, *self.skipped]):
+            timings = self.timings[name] or [0]
+            logger.info(
+                f"{name} | runs: {len(self.timings[name])}, "
+                f"skipped: {self.skipped[name]}, "
+                f"median {statistics.median(timings):.1f}s, "
+                f"max {max(timings):.1f}s, total {sum(timings):.0f}s"
+            )
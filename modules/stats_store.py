@@ -0,0 +1,135 @@
+import csv
+import datetime
+import sqlite3
+import time
+
+
+SECONDS_IN_DAY = 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id INTEGER PRIMARY KEY,
+    address TEXT NOT NULL UNIQUE,
+    user_id TEXT
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    account_id INTEGER NOT NULL REFERENCES accounts (id),
+    ts INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    xp INTEGER NOT NULL,
+    PRIMARY KEY (account_id, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS snapshots_ts ON snapshots (ts);
+"""
+
+# Last known xp and level of every account for every day it was recorded
+DAILY_SNAPSHOTS = """
+SELECT account_id, ts / 86400 AS day, MAX(level) AS level, MAX(xp) AS xp
+FROM snapshots
+WHERE ts >= :since
+GROUP BY account_id, day
+"""
+
+
+def format_day(day):
+    return datetime.datetime.utcfromtimestamp(day * SECONDS_IN_DAY).date().isoformat()
+
+
+class StatsStore:
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def record(self, stats, ts=None):
+        ts = int(ts or time.time())
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO accounts (address, user_id) VALUES (?, ?) "
+                "ON CONFLICT (address) DO UPDATE SET user_id = excluded.user_id",
+                [(address, info["userId"]) for address, info in stats.items()],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO snapshots (account_id, ts, level, xp) "
+                "SELECT id, ?, ?, ? FROM accounts WHERE address = ?",
+                [
+                    (ts, info["level"], info["xp"], address)
+                    for address, info in stats.items()
+                ],
+            )
+
+    def xp_delta_per_day(self, days=None):
+        since = self._since(days) if days else 0
+        # One extra day is read so the first day in range has a delta too
+        cursor = self.connection.execute(
+            f"""
+            WITH daily AS ({DAILY_SNAPSHOTS}),
+            deltas AS (
+                SELECT account_id, day, level, xp,
+                       xp - LAG(xp) OVER (PARTITION BY account_id ORDER BY day) AS delta
+                FROM daily
+            )
+            SELECT address, day, level, xp, delta
+            FROM deltas JOIN accounts ON accounts.id = deltas.account_id
+            WHERE day >= :first_day
+            ORDER BY address, day
+            """,
+            {
+                "since": max(since - SECONDS_IN_DAY, 0),
+                "first_day": since // SECONDS_IN_DAY,
+            },
+        )
+        for address, day, level, xp, delta in cursor:
+            yield address, format_day(day), level, xp, delta
+
+    def stalled_accounts(self, days):
+        return self.connection.execute(
+            """
+            WITH latest AS (
+                SELECT account_id, MAX(xp) AS xp FROM snapshots GROUP BY account_id
+            ),
+            baseline AS (
+                SELECT account_id, MAX(xp) AS xp FROM snapshots
+                WHERE ts <= :cutoff GROUP BY account_id
+            )
+            SELECT address, user_id, latest.xp
+            FROM latest
+            JOIN baseline USING (account_id)
+            JOIN accounts ON accounts.id = latest.account_id
+            WHERE latest.xp <= baseline.xp
+            ORDER BY address
+            """,
+            {"cutoff": int(time.time()) - days * SECONDS_IN_DAY},
+        ).fetchall()
+
+    def fleet_totals(self, days=None):
+        cursor = self.connection.execute(
+            f"""
+            WITH daily AS ({DAILY_SNAPSHOTS})
+            SELECT day, COUNT(*), SUM(level), SUM(xp)
+            FROM daily
+            GROUP BY day
+            ORDER BY day
+            """,
+            {"since": self._since(days) if days else 0},
+        )
+        return [
+            (format_day(day), accounts, levels, xp)
+            for day, accounts, levels, xp in cursor
+        ]
+
+    def export_csv(self, path, days=None):
+        rows = 0
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["address", "date", "level", "xp", "xp_delta"])
+            for row in self.xp_delta_per_day(days):
+                writer.writerow(row)
+                rows += 1
+        return rows
+
+    def _since(self, days):
+        today = int(time.time()) // SECONDS_IN_DAY
+        return (today - days + 1) * SECONDS_IN_DAY
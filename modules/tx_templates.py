@@ -0,0 +1,146 @@
+import json
+import re
+
+from eth_abi import decode
+from eth_utils import function_abi_to_4byte_selector, to_checksum_address
+from hexbytes import HexBytes
+
+from modules.utils import NonRetryableError
+
+
+# Read here rather than from config, which needs the private keys and proxies files
+with open("data/abi/daily_claim_abi.json", "r") as f:
+    DAILY_CLAIM_ABI = json.load(f)
+
+MINT_GAS_LIMIT = 210000
+DAILY_GAS_LIMIT = 100000
+RUFFLE_GAS_LIMIT = 100000
+
+MINT_CONTRACT = to_checksum_address("0xc92df682a8dc28717c92d7b5832376e6ac15a90d")
+DAILY_CONTRACT = to_checksum_address("0xe3ba0072d1da98269133852fba1795419d72baf4")
+RUFFLE_CONTRACT = to_checksum_address("0x557764618fc2f4eca692d422ba79c70f237113e6")
+
+SIGNATURE_LENGTH = 65
+MAX_UINT256 = 2**256 - 1
+
+
+def _word(value):
+    return format(value, "064x")
+
+
+# Static parts of the calldata, only the account's values are filled in per call
+ADDRESS_PADDING = "0" * 24
+SIGNATURE_HEAD = _word(SIGNATURE_LENGTH)
+SIGNATURE_PADDING = "00" * (-SIGNATURE_LENGTH % 32)
+SIGNATURE_PATTERN = re.compile(f"0x[0-9a-fA-F]{{{SIGNATURE_LENGTH * 2}}}")
+
+MINT_PREFIX = "0xf75e0384" + _word(0x20) + ADDRESS_PADDING
+# Category 1, then the offset of the signature inside the struct
+MINT_MIDDLE = _word(1) + _word(0x60) + SIGNATURE_HEAD
+
+DAILY_DATA = "0x9e4cda43"
+
+RUFFLE_PREFIX = "0x9fc96c7e" + _word(0x20) + ADDRESS_PADDING
+RUFFLE_SIGNATURE_OFFSET = _word(0x80) + SIGNATURE_HEAD
+
+SIGN_IN_TIME_PREFIX = (
+    "0x"
+    + function_abi_to_4byte_selector(
+        next(
+            item
+            for item in DAILY_CLAIM_ABI
+            if item.get("name") == "getTimeUntilNextSignIn"
+        )
+    ).hex()
+    + ADDRESS_PADDING
+)
+
+
+class InvalidCalldata(NonRetryableError):
+    pass
+
+
+def encode_address(address):
+    if not isinstance(address, str) or len(address) != 42 or address[:2] != "0x":
+        raise InvalidCalldata(f"Invalid address: {address!r}")
+    return address[2:].lower()
+
+
+def encode_signature(signature):
+    if not isinstance(signature, str) or SIGNATURE_PATTERN.fullmatch(signature) is None:
+        raise InvalidCalldata(f"Signature must be {SIGNATURE_LENGTH} bytes of hex")
+    return signature[2:].lower() + SIGNATURE_PADDING
+
+
+def encode_uint(name, value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise InvalidCalldata(f"{name} is not an integer: {value!r}")
+    if not 0 <= value <= MAX_UINT256:
+        raise InvalidCalldata(f"{name} is out of uint256 range: {value}")
+    return _word(value)
+
+
+def encode_mint(address, signature):
+    return (
+        MINT_PREFIX
+        + encode_address(address)
+        + MINT_MIDDLE
+        + encode_signature(signature)
+    )
+
+
+def encode_daily(address):
+    return DAILY_DATA
+
+
+def encode_ruffle(address, xp, nonce, signature):
+    return (
+        RUFFLE_PREFIX
+        + encode_address(address)
+        + encode_uint("xp", xp)
+        + encode_uint("nonce", nonce)
+        + RUFFLE_SIGNATURE_OFFSET
+        + encode_signature(signature)
+    )
+
+
+class TransactionTemplate:
+    def __init__(self, name, to, chain_id, gas_limit, encode):
+        self.name = name
+        self.to = to
+        self.chain_id = chain_id
+        self.gas_limit = gas_limit
+        self.encode = encode
+
+    def build(self, address, nonce, gas_price, data):
+        return {
+            "to": self.to,
+            "from": address,
+            "data": data,
+            "gasPrice": gas_price,
+            "gas": self.gas_limit,
+            "nonce": nonce,
+            "chainId": self.chain_id,
+        }
+
+
+MINT = TransactionTemplate("mint", MINT_CONTRACT, 56, MINT_GAS_LIMIT, encode_mint)
+DAILY = TransactionTemplate(
+    "daily", DAILY_CONTRACT, 56, DAILY_GAS_LIMIT, encode_daily
+)
+RUFFLE = TransactionTemplate(
+    "ruffle", RUFFLE_CONTRACT, 204, RUFFLE_GAS_LIMIT, encode_ruffle
+)
+
+
+def sign_in_time_call(address):
+    return {
+        "to": DAILY_CONTRACT,
+        "data": SIGN_IN_TIME_PREFIX + encode_address(address),
+    }
+
+
+def decode_uint(result):
+    return decode(["uint256"], HexBytes(result))[0]
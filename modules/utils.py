@@ -1,17 +1,18 @@
 import asyncio
 import random
-import traceback
 from loguru import logger
 
 from settings import MAX_SLEEP, MIN_SLEEP, RETRIES
 
 
+class NonRetryableError(RuntimeError):
+    pass
+
+
 async def sleep(account=None):
     sleep_time = random.randint(MIN_SLEEP, MAX_SLEEP)
     if account:
-        logger.info(
-            f"[{account.id}][{account.address}] Sleeping for {sleep_time} seconds"
-        )
+        account.logger.info(f"Sleeping for {sleep_time} seconds")
     else:
         logger.info(f"Sleeping for {sleep_time} seconds")
     await asyncio.sleep(sleep_time)
@@ -24,10 +25,12 @@ def retry(func):
             try:
                 result = await func(*args, **kwargs)
                 return result
+            except NonRetryableError as e:
+                logger.error(f"Error | {e}")
+                return None
             except Exception as e:
-                traceback.print_exc()
                 retries += 1
-                logger.error(f"Error | {e}")
+                logger.opt(exception=e).error(f"Error | {e}")
                 if retries <= RETRIES:
                     logger.info(f"Retrying... {retries}/{RETRIES}")
                     await sleep()
@@ -58,12 +58,29 @@ USER_IDS_TO_FOLLOW = [
     "OwZtyv3SxZ",
 ]
 
+# Cache quest state of each account in data/quest_state.json until the UTC daily
+# reset, saved at the end of the StarryNift run. Accounts with all quests done
+# today skip the daily-tasks request. Not used when replaying cassettes
+CACHE_QUEST_STATE = True
+
 DISABLE_SSL = False
 
 SHUFFLE_ACCOUNTS = False
 RETRIES = 2
 
+# Accounts processed at the same time. With ADAPTIVE_THREADS it is only the starting
+# value: it grows while API and RPC latency and errors stay low and backs off
+# on 429, 5xx and timeouts, staying between MIN_THREADS and MAX_THREADS
 THREADS = 5
+ADAPTIVE_THREADS = True
+MIN_THREADS = 1
+MAX_THREADS = 50
+# Requests per adjustment step
+CONCURRENCY_WINDOW = 50
+# Share of failed requests in a window that lowers the limit
+ERROR_RATE_LIMIT = 0.05
+# Limit is lowered when median latency exceeds the fastest seen this many times
+LATENCY_TOLERANCE = 3
 
 MIN_SLEEP = 30
 MAX_SLEEP = 50
@@ -71,6 +88,102 @@ MAX_SLEEP = 50
 BNB_RPC = "https://bsc.publicnode.com"
 OPBNB_RPC = "https://opbnb-rpc.publicnode.com"
 
+# Request budgets shared by all threads
+# (host, endpoint class): (requests per second, burst size)
+# Endpoint classes: auth, webhook, ping, default for StarryNift API and rpc for RPCs
+RATE_LIMITS = {
+    ("api.starrynift.art", "auth"): (2, 4),
+    ("api.starrynift.art", "webhook"): (2, 4),
+    ("api.starrynift.art", "ping"): (5, 10),
+    ("api.starrynift.art", "default"): (5, 10),
+    ("bsc.publicnode.com", "rpc"): (20, 40),
+    ("opbnb-rpc.publicnode.com", "rpc"): (20, 40),
+}
+DEFAULT_RATE_LIMIT = (5, 10)
+
+# How many times a request is repeated after 429 before giving up
+RATE_LIMIT_RETRIES = 3
+
+# Gas price = next base fee + median of the priority fee percentile over recent blocks
+# Transactions not mined after replace_after_blocks are resent with the same nonce
+# and gas price bumped by bump_percent, up to max_gwei
+FEES = {
+    56: {  # BSC
+        "blocks": 10,
+        "percentile": 50,
+        "min_gwei": 1,
+        "max_gwei": 5,
+        "replace_after_blocks": 5,
+        "bump_percent": 15,
+    },
+    204: {  # opBNB
+        "blocks": 20,
+        "percentile": 50,
+        "min_gwei": 0.00002,
+        "max_gwei": 0.001,
+        "replace_after_blocks": 10,
+        "bump_percent": 15,
+    },
+}
+# Gas price is shared by all accounts for this many seconds
+FEE_CACHE_SECONDS = 3
+
+# Simulate every transaction with eth_call first and don't send the ones that revert
+SIMULATE_TRANSACTIONS = True
+
+# Check BSC and opBNB balances of all accounts before StarryNift module starts
+# Accounts that need top up are saved to data/top_up.csv
+PREFLIGHT_BALANCES = True
+# Skip accounts without enough BNB on BSC. Ruffle is always skipped without opBNB BNB
+PREFLIGHT_SKIP_UNDERFUNDED = True
+# Required balance = gas limit * current gas price * margin
+PREFLIGHT_GAS_MARGIN = 1.5
+# Balances requested in one JSON-RPC batch
+BALANCE_BATCH_SIZE = 100
+
+# Console log level. Console output is human-readable
+LOG_LEVEL = "INFO"
+# Compact JSON log (account id, address, stage, duration), None to disable
+LOG_FILE = "logs/run.jsonl"
+LOG_FILE_LEVEL = "DEBUG"
+# Only 1 of N repetitive lines (below WARNING) is logged, e.g. online quest pings
+LOG_SAMPLING = {
+    "ping": 10,
+}
+
+# History of level and xp recorded by Get accounts stats
+STATS_DB = "data/stats.db"
+# Days shown and exported by Get accounts stats history, None for all history
+STATS_HISTORY_DAYS = 30
+# Accounts without xp progress for this many days are reported as stalled
+STALLED_DAYS = 3
+
+# Record/replay of StarryNift API and RPC traffic, one cassette file per account
+# None - disabled, "record" - save traffic, "replay" - serve saved traffic offline
+# Secrets and signatures are redacted in cassettes
+CASSETTE_MODE = None
+CASSETTE_DIR = "data/cassettes"
+# Recorded latencies are multiplied by this value on replay, 0 to disable waiting
+REPLAY_LATENCY_SCALE = 1.0
+
+
+# ___________________________________________
+# |                PROFILING                |
+
+# Used with python main.py --profile
+# Results (stacks.folded for flame graphs, cprofile.prof) are saved here
+PROFILE_DIR = "logs/profile"
+# Seconds between stack samples of the event loop thread
+PROFILE_SAMPLE_INTERVAL = 0.005
+# Seconds between event loop lag measurements
+PROFILE_LAG_INTERVAL = 0.1
+# Event loop blocked longer than this is logged with the blocking stack
+PROFILE_BLOCKED_THRESHOLD = 0.1
+# Deterministic cProfile of the whole run, slows the run down noticeably
+PROFILE_CPROFILE = False
+# asyncio debug mode with its slow callback warnings, adds overhead too
+PROFILE_ASYNCIO_DEBUG = False
+
 
 # ___________________________________________
 # |             BINANCE WITHDRAW            |
@@ -78,6 +191,9 @@ OPBNB_RPC = "https://opbnb-rpc.publicnode.com"
 BINANCE_API_KEY = ""
 BINANCE_SECRET_KEY = ""
 
+# Withdraw only to BSC addresses listed in data/top_up.csv
+WITHDRAW_ONLY_TOP_UP = False
+
 MIN_WITHDRAW = 0.01001
 MAX_WITHDRAW = 0.0105
 